@@ -0,0 +1,214 @@
+"""
+=======================================
+Time alignment of sample streams (:mod:`Alignment`)
+=======================================
+
+Puts the torque stream and other timestamped streams (inverter, wind
+profile, ...) on a common uniform time grid.
+
+    ♦ SensorStream: (timestamp, values) samples of a Torquimeter
+    ♦ Merge: streaming k-way merge of time-ordered streams
+    ♦ GridAligner: incremental resampling of merged samples onto the grid
+    ♦ Align: Merge + GridAligner over iterables (live or recorded)
+    ♦ ResampleCapture / AlignArrays: vectorized versions for recordings
+
+A stream is any iterable of (t, values) with increasing t (epoch
+seconds, like Torquimeter.timestamp) and values a tuple of floats.
+The grid is made of multiples of `period`, starting at the first grid
+time covered by every stream.
+
+    from Alignment import Align, SensorStream
+
+    inverter = ((row.t, (row.id, row.iq)) for row in inverter_log)
+    for row in Align([SensorStream(sensor), inverter], period=0.001):
+        t, torque, rpm, id, iq = row
+"""
+
+import heapq
+from collections import deque
+from math import ceil
+
+def SensorStream(sensor: object, count: int|None = None, fields = ('torque', 'rpm')):
+
+    """
+    Timestamped samples of a Torquimeter. Missing samples (no valid
+    reply) are skipped, so they are interpolated on the grid.
+
+    Args:
+        sensor (Torquimeter): Sensor to read (polling or continuous mode).
+        count (int, optional): ReadRaw calls, endless when None.
+        fields (tuple[str]): 'torque', 'rpm', 'channel_0', 'channel_1'.
+    Yields:
+        (tuple[float, tuple]): (timestamp, values).
+    """
+
+    from LCTSfunctions import SampleStatus
+
+    columns = {'channel_0': 0, 'channel_1': 1, 'torque': 2, 'rpm': 3}
+    index = [columns[field] for field in fields]
+    last = None
+    for sample in sensor.Stream(count):
+        if sample[6] == SampleStatus.MISSING or sample[7] == last: continue
+        last = sample[7]
+        yield sample[7], tuple(sample[i] for i in index)
+
+def Merge(streams: list):
+
+    """
+    Streaming k-way merge of time-ordered streams.
+
+    Yields:
+        (tuple[float, int, tuple]): (t, stream index, values) in time order.
+    """
+
+    def Tag(index, stream):
+        for t, values in stream:
+            yield t, index, values
+    return heapq.merge(*(Tag(i, stream) for i, stream in enumerate(streams)),
+                       key=lambda sample: sample[0])
+
+class GridAligner:
+
+    def __init__(self, period: float, streams: int, method = 'linear', start: float|None = None):
+
+        """
+        Args:
+            period (float): Grid spacing (s).
+            streams (int): Number of streams fed.
+            method (str): 'linear' interpolation or 'previous' (sample and hold).
+            start (float, optional): First grid time; by default the first
+                                     multiple of period covered by all streams.
+        """
+
+        if method not in ('linear', 'previous'):
+            raise ValueError("method must be 'linear' or 'previous'")
+        self.period = period
+        self.linear = method == 'linear'
+        self.buffers = [deque() for i in range(streams)] # samples still needed per stream
+        self.k = None if start == None else ceil(start/period) # index of the next grid time
+
+    def Feed(self, index: int, t: float, values: tuple) -> list[tuple]:
+
+        """
+        Adds a sample of stream `index`. Samples must be fed in time
+        order across all streams (see Merge); out of order samples of
+        a stream are ignored.
+
+        Returns:
+            (list[tuple]): Grid rows now complete: (t, *values of stream 0, *values of stream 1, ...).
+        """
+
+        buffer = self.buffers[index]
+        if buffer and t <= buffer[-1][0]: return []
+        buffer.append((t, values))
+        return self.Emit()
+
+    def Emit(self) -> list[tuple]:
+        buffers = self.buffers
+        for buffer in buffers:
+            if not buffer: return []
+        period = self.period
+        if self.k == None:
+            self.k = ceil(max(buffer[0][0] for buffer in buffers)/period)
+        horizon = min(buffer[-1][0] for buffer in buffers) # every stream reached it
+        rows = []
+        grid_t = self.k*period
+        while grid_t <= horizon:
+            row = [grid_t]
+            for buffer in buffers:
+                while len(buffer) >= 2 and buffer[1][0] <= grid_t: buffer.popleft()
+                t0, v0 = buffer[0]
+                if t0 > grid_t: # before the first sample of this stream
+                    row.extend(v0)
+                elif self.linear and len(buffer) >= 2:
+                    t1, v1 = buffer[1]
+                    w = (grid_t-t0)/(t1-t0)
+                    row.extend(a + (b-a)*w for a, b in zip(v0, v1))
+                else:
+                    row.extend(v0)
+            rows.append(tuple(row))
+            self.k += 1
+            grid_t = self.k*period
+        return rows
+
+def Align(streams: list, period: float, method = 'linear', start: float|None = None):
+
+    """
+    Merges time-ordered streams and resamples them onto a uniform grid.
+
+    Yields:
+        (tuple): (t, *values of stream 0, *values of stream 1, ...).
+    """
+
+    aligner = GridAligner(period, len(streams), method, start)
+    for t, index, values in Merge(streams):
+        for row in aligner.Feed(index, t, values):
+            yield row
+
+def AlignArrays(grid, sources: list, method = 'linear'):
+
+    """
+    Vectorized alignment of recorded series onto a grid.
+
+    Args:
+        grid (array_like): Grid times.
+        sources (list[tuple]): (t, values) with t increasing, shape (n,),
+                               and values shape (n,) or (n, columns).
+        method (str): 'linear' or 'previous'.
+    Returns:
+        (numpy.ndarray): Shape (len(grid), 1 + total columns), first column is the grid.
+    """
+
+    import numpy as np
+
+    grid = np.asarray(grid, dtype=np.float64)
+    columns = [grid]
+    for t, values in sources:
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1: values = values[:, None]
+        if method == 'linear':
+            columns.extend(np.interp(grid, t, values[:, j]) for j in range(values.shape[1]))
+        else:
+            i = np.clip(np.searchsorted(t, grid, side='right')-1, 0, len(t)-1)
+            columns.extend(values[i, j] for j in range(values.shape[1]))
+    return np.column_stack(columns)
+
+def ResampleCapture(path: str, period: float, fields = ('torque', 'rpm'), method = 'linear',
+                    start: float|None = None, chunk_size = 1 << 20):
+
+    """
+    Resamples a capture (see :mod:`Capture`) onto a uniform grid, chunk by
+    chunk. Missing samples and out of order timestamps are skipped.
+
+    Yields:
+        (numpy.ndarray): Blocks of shape (grid points, 1 + len(fields)),
+                         first column is the grid time.
+    """
+
+    import numpy as np
+    from Capture import Chunks
+    from LCTSfunctions import SampleStatus
+
+    missing = int(SampleStatus.MISSING)
+    k = None if start == None else ceil(start/period)
+    last = None # last valid row of the previous chunk
+    for chunk in Chunks(path, chunk_size):
+        if 'status' in chunk.dtype.names:
+            chunk = chunk[chunk['status'] != missing]
+        t = np.asarray(chunk['time'], dtype=np.float64)
+        values = np.column_stack([np.asarray(chunk[field], dtype=np.float64) for field in fields])
+        if last != None:
+            t = np.concatenate(([last[0]], t))
+            values = np.vstack((last[1], values))
+        if len(t) == 0: continue
+        # drops samples not later than every previous one, like GridAligner.Feed
+        keep = t > np.maximum.accumulate(np.concatenate(([-np.inf], t[:-1])))
+        t, values = t[keep], values[keep]
+        if k == None: k = ceil(t[0]/period)
+        stop = int(np.floor(t[-1]/period))
+        if stop >= k:
+            grid = np.arange(k, stop+1)*period
+            yield AlignArrays(grid, [(t, values)], method)
+            k = stop+1
+        last = (t[-1], values[-1])
@@ -0,0 +1,168 @@
+"""
+=======================================
+Serial link auto-tuning (:mod:`AutoTune`)
+=======================================
+
+Sweeps the link settings of a Torquimeter (read timeout,
+inter-telegram gap, optionally the read chunk size and the baud rate),
+measuring for each combination the samples per second, the ReadRaw latency
+percentiles and the rate of timeouts and rejected frames. The fastest
+setting whose error rate stays below a limit is recommended and can be
+saved as a profile for the port (~/.lcts/profiles/<port>.json).
+
+    from AutoTune import Tune, Apply, SaveProfile, LoadProfile
+
+    best, results = Tune(sensor)
+    Apply(sensor, best)
+    SaveProfile(sensor.serialport.port, best)
+    ...
+    Apply(sensor, LoadProfile('/dev/ttyUSB0'))
+
+Changing the baud rate only changes the host side: the device must
+already be configured for the rates passed in `baudrates`.
+"""
+
+import json
+import os
+import re
+from itertools import product
+from time import perf_counter, perf_counter_ns
+
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.lcts', 'profiles')
+
+TIMEOUTS = (0.001, 0.002, 0.003, 0.005)
+# chunk_size only caps FrameReader reads, which in polling mode are already
+# shorter than a frame, so by default it is not swept (pass chunk_sizes to try)
+CHUNK_SIZES = (None,)
+GAPS = (0.0, 0.00001, 0.0001)
+
+def Settings(sensor: object) -> dict:
+
+    """
+    Current link settings of a Torquimeter.
+    """
+
+    return {"baudrate": sensor.serialport.baudrate,
+            "timeout": sensor.serialport.timeout,
+            "chunk_size": sensor.reader.chunk_size,
+            "gap": sensor.gap}
+
+def Apply(sensor: object, settings: dict) -> None:
+
+    """
+    Applies link settings (as returned by Tune or LoadProfile) to a Torquimeter.
+    """
+
+    port = sensor.serialport
+    if "baudrate" in settings and port.baudrate != settings["baudrate"]:
+        port.baudrate = settings["baudrate"]
+    if "timeout" in settings: port.timeout = settings["timeout"]
+    if "chunk_size" in settings: sensor.reader.chunk_size = settings["chunk_size"]
+    if "gap" in settings: sensor.gap = settings["gap"]
+    port.reset_input_buffer()
+    sensor.reader.Clear()
+
+def Measure(sensor: object, samples = 500) -> dict:
+
+    """
+    Runs `samples` ReadRaw requests with the current settings.
+
+    Returns:
+        (dict): samples_per_s (valid samples only), latency_p50/p95/p99/max (s),
+                timeouts, checksum_errors, error_rate (fraction of missing samples).
+    """
+
+    if samples < 1:
+        raise ValueError("samples must be at least 1")
+    reader = sensor.reader
+    timeouts = reader.timeouts
+    checksum_errors = reader.checksum_errors
+    missing = sensor.missing
+    latencies = []
+    start = perf_counter()
+    for i in range(samples):
+        t0 = perf_counter_ns()
+        sensor.ReadRaw()
+        latencies.append(perf_counter_ns()-t0)
+    elapsed = perf_counter()-start
+    timeouts = reader.timeouts - timeouts
+    checksum_errors = reader.checksum_errors - checksum_errors
+    errors = sensor.missing - missing
+    latencies.sort()
+    def Percentile(p): return latencies[min(int(p*len(latencies)), len(latencies)-1)]/1e9
+    return {"samples_per_s": (samples-errors)/elapsed,
+            "latency_p50": Percentile(0.50),
+            "latency_p95": Percentile(0.95),
+            "latency_p99": Percentile(0.99),
+            "latency_max": latencies[-1]/1e9,
+            "timeouts": timeouts,
+            "checksum_errors": checksum_errors,
+            "error_rate": errors/samples}
+
+def Tune(sensor: object, timeouts = TIMEOUTS, chunk_sizes = CHUNK_SIZES, gaps = GAPS,
+         baudrates: list[int]|None = None, samples = 500, max_error_rate = 0.001,
+         apply = False) -> tuple[dict|None, list[dict]]:
+
+    """
+    Measures every combination of settings and picks the highest
+    samples/s with error_rate <= max_error_rate (ties: lower p99 latency).
+
+    Args:
+        sensor (Torquimeter): Sensor in polling mode.
+        timeouts, chunk_sizes, gaps (tuple): Values to sweep.
+        baudrates (list[int], optional): Host baud rates to sweep, the device
+                                         must be configured for them. Current only when None.
+        samples (int): ReadRaw requests per combination, at least 1.
+        max_error_rate (float): Max fraction of failed samples accepted.
+        apply (bool): Keep the best settings applied; otherwise the original ones are restored.
+    Returns:
+        (tuple[dict, list[dict]]): Best settings with their measurements
+        (None if none was stable) and the results of every combination.
+    """
+
+    if samples < 1:
+        raise ValueError("samples must be at least 1")
+    original = Settings(sensor)
+    if baudrates == None: baudrates = (original["baudrate"],)
+    results = []
+    for baudrate, timeout, chunk_size, gap in product(baudrates, timeouts, chunk_sizes, gaps):
+        settings = {"baudrate": baudrate, "timeout": timeout, "chunk_size": chunk_size, "gap": gap}
+        Apply(sensor, settings)
+        sensor.ReadRaw() # warm up, also drops a late reply of the previous setting
+        settings.update(Measure(sensor, samples))
+        results.append(settings)
+    stable = [r for r in results if r["error_rate"] <= max_error_rate]
+    best = max(stable, key=lambda r: (r["samples_per_s"], -r["latency_p99"])) if stable else None
+    Apply(sensor, best if apply and best != None else original)
+    return best, results
+
+def ProfilePath(port: str) -> str:
+    return os.path.join(PROFILE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', port.strip('/')) + '.json')
+
+def SaveProfile(port: str, settings: dict) -> str:
+
+    """
+    Saves the settings (and measurements) as the profile of a port.
+
+    Returns:
+        (str): Profile path.
+    """
+
+    path = ProfilePath(port)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(dict(settings, port=port), file, indent=1)
+    return path
+
+def LoadProfile(port: str) -> dict|None:
+
+    """
+    Returns:
+        (dict): Saved profile of the port, None if there is none.
+    """
+
+    try:
+        with open(ProfilePath(port)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,110 @@
+"""
+=======================================
+Calibration of the measurement channels (:mod:`Calibration`)
+=======================================
+
+Converts the signed counts returned by Methods.TransformData into
+engineering units. The full-scale factor (full_scale/byte_resolution)
+is computed once; an optional lab correction can be applied on top of it:
+
+    ♦ polynomial: corrected = c0 + c1*x + c2*x**2 + ... (ascending coefficients)
+    ♦ table: piecewise-linear curve through (measured, reference) points,
+             extrapolated with the first/last segment
+
+where x is the linear (full-scale) value. Apply() converts one sample,
+ApplyArray() converts NumPy batches (streams, captures) with the same result.
+
+    from Calibration import Calibration
+
+    torque = Calibration(full_scale=100, table=[(-100,-99.2),(0,0.05),(100,100.6)])
+    torque.Apply(12500)             # single sample
+    torque.ApplyArray(counts)       # numpy array of counts
+"""
+
+from bisect import bisect_right
+
+class Calibration:
+
+    def __init__(self, full_scale: float, byte_resolution = 25000,
+                 polynomial: list[float]|None = None,
+                 table: list[tuple[float,float]]|None = None):
+
+        """
+        Args:
+            full_scale (float): Engineering value at byte_resolution counts (Tm_max, Rpm_max).
+            byte_resolution (int): Counts at full scale.
+            polynomial (list[float], optional): Ascending correction coefficients.
+            table (list[tuple[float,float]], optional): (measured, reference) points, at least two.
+        """
+
+        if polynomial != None and table != None:
+            raise ValueError("use either a polynomial or a table correction, not both")
+        self.full_scale = full_scale
+        self.byte_resolution = byte_resolution
+        self.scale = full_scale/byte_resolution # counts -> engineering units
+        self.polynomial = tuple(float(c) for c in polynomial) if polynomial != None else None
+        self.table = None
+        if table != None:
+            points = sorted((float(x), float(y)) for x, y in table)
+            if len(points) < 2:
+                raise ValueError("a calibration table needs at least two points")
+            xs = [p[0] for p in points]
+            if len(set(xs)) != len(xs):
+                raise ValueError("calibration table has repeated measured values")
+            self.table = tuple(points)
+            # slope/intercept of each segment, so both paths evaluate the same line
+            self._xs = xs
+            self._slopes = [(points[i+1][1]-points[i][1])/(points[i+1][0]-points[i][0])
+                            for i in range(len(points)-1)]
+            self._intercepts = [points[i][1]-self._slopes[i]*points[i][0]
+                                for i in range(len(points)-1)]
+
+    def Apply(self, counts: int) -> float:
+
+        """
+        Converts one sample of counts to engineering units.
+        """
+
+        value = counts*self.scale
+        if self.polynomial != None:
+            result = 0.0
+            for c in reversed(self.polynomial): # Horner
+                result = result*value + c
+            return result
+        if self.table != None:
+            i = bisect_right(self._xs, value) - 1
+            i = min(max(i, 0), len(self._slopes)-1)
+            return self._slopes[i]*value + self._intercepts[i]
+        return value
+
+    def ApplyArray(self, counts):
+
+        """
+        Vectorized Apply over an array of counts.
+
+        Args:
+            counts (array_like): Counts, any shape.
+        Returns:
+            (numpy.ndarray): float64 values in engineering units.
+        """
+
+        import numpy as np
+
+        value = np.asarray(counts, dtype=np.float64)*self.scale
+        if self.polynomial != None:
+            return np.polynomial.polynomial.polyval(value, self.polynomial)
+        if self.table != None:
+            i = np.searchsorted(self._xs, value, side='right') - 1
+            np.clip(i, 0, len(self._slopes)-1, out=i)
+            return np.asarray(self._slopes)[i]*value + np.asarray(self._intercepts)[i]
+        return value
+
+    def ToDict(self) -> dict:
+        return {"full_scale": self.full_scale,
+                "byte_resolution": self.byte_resolution,
+                "polynomial": list(self.polynomial) if self.polynomial != None else None,
+                "table": [list(p) for p in self.table] if self.table != None else None}
+
+    def FromDict(d: dict) -> "Calibration":
+        return Calibration(d["full_scale"], d.get("byte_resolution", 25000),
+                           polynomial=d.get("polynomial"), table=d.get("table"))
@@ -0,0 +1,255 @@
+"""
+=======================================
+Recording of ReadRaw samples (:mod:`Capture`)
+=======================================
+
+A capture is a flat binary file of fixed-size records (RECORD dtype)
+plus a JSON sidecar (<path>.json) with the sensor configuration and
+calibration used during the recording. Keeping the raw counts next
+to the calibrated values allows re-calibrating old recordings, and
+the flat layout can be memory mapped and read in chunks.
+
+    from Capture import CaptureWriter, Open
+
+    with CaptureWriter('run01.lcts', sensor) as capture:
+        for i in range(10000):
+            sensor.ReadRaw()
+            capture.Append(sensor)
+
+    records, metadata = Open('run01.lcts')
+    records['torque'].mean()
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from Calibration import Calibration
+
+RECORD = np.dtype([
+    ('time',          '<f8'), # Torquimeter.timestamp of the sample (s, epoch)
+    ('channel_0',     '<i4'), # MesurementChannel_0
+    ('channel_1',     '<i4'), # MesurementChannel_1
+    ('torque_counts', '<i4'), # calibrated channel 0, signed counts
+    ('rpm_counts',    '<i4'), # calibrated channel 1, signed counts
+    ('torque',        '<f8'), # N.m
+    ('rpm',           '<f8'), # RPM
+    ('fullstroke',    'u1'),
+    ('overload',      'u1'),
+    ('status',        'u1'), # LCTSfunctions.SampleStatus: 0 fresh, 1 retried, 2 missing
+])
+
+def SensorMetadata(sensor: object) -> dict:
+
+    """
+    Configuration of a Torquimeter to be stored with its recordings.
+    """
+
+    return {"Tm_max": sensor.Tm_max,
+            "Rpm_max": sensor.Rpm_max,
+            "byte_resolution": sensor.byte_resolution,
+            "torque_calibration": sensor.torque_calibration.ToDict(),
+            "rpm_calibration": sensor.rpm_calibration.ToDict()}
+
+def SensorRow(sensor: object, t: float|None = None) -> tuple:
+
+    """
+    Last sample read by a Torquimeter as a RECORD row.
+    """
+
+    data = sensor.data if sensor.data else (0, 0, 0, 0, 0)
+    if t == None: t = sensor.timestamp if sensor.timestamp else time.time()
+    return (t,
+            data[0], data[1], data[2], data[3],
+            sensor.Torque_calibrated, sensor.RPM_calibrated,
+            data[4], sensor.Overloadflag, sensor.status)
+
+def ToRecords(records) -> np.ndarray:
+
+    """
+    Returns rows as a RECORD array. Rows of other dtypes (e.g. older
+    captures) are copied field by field, missing fields are zero.
+    """
+
+    records = np.asarray(records)
+    if records.dtype == RECORD: return records
+    converted = np.zeros(len(records), dtype=RECORD)
+    for name in RECORD.names:
+        if name in records.dtype.names: converted[name] = records[name]
+    return converted
+
+class CaptureWriter:
+
+    def __init__(self, path: str, sensor: object = None, metadata: dict|None = None,
+                 flush_every = 4096):
+
+        """
+        Args:
+            path (str): Capture file, overwritten if it exists.
+            sensor (Torquimeter, optional): Its configuration is saved in the sidecar.
+            metadata (dict, optional): Extra entries for the sidecar.
+            flush_every (int): Rows kept in memory before writing to disk.
+        """
+
+        self.path = path
+        self.file = open(path, 'wb')
+        self.rows = []
+        self.flush_every = flush_every
+        self.count = 0
+        self.metadata = {"created": time.time()}
+        if sensor != None:
+            self.metadata.update(SensorMetadata(sensor))
+        if metadata != None:
+            self.metadata.update(metadata)
+        self.metadata.update({"format": "LCTS capture", "version": 2,
+                              "dtype": [list(field) for field in RECORD.descr]})
+        self.WriteMetadata()
+
+    def Append(self, sensor: object, t: float|None = None) -> None:
+
+        """
+        Appends the last sample read by the sensor.
+        """
+
+        self.rows.append(SensorRow(sensor, t))
+        if len(self.rows) >= self.flush_every:
+            self.Flush()
+
+    def AppendRow(self, row: tuple) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_every:
+            self.Flush()
+
+    def AppendRecords(self, records) -> None:
+
+        """
+        Appends an array of RECORD rows.
+        """
+
+        self.Flush()
+        records = ToRecords(records)
+        records.tofile(self.file)
+        self.count += len(records)
+
+    def Flush(self) -> None:
+        if self.rows:
+            np.array(self.rows, dtype=RECORD).tofile(self.file)
+            self.count += len(self.rows)
+            self.rows = []
+        self.file.flush()
+
+    def WriteMetadata(self) -> None:
+        self.metadata["count"] = self.count
+        with open(self.path + '.json', 'w') as file:
+            json.dump(self.metadata, file, indent=1)
+
+    def Close(self) -> None:
+        if self.file.closed: return
+        self.Flush()
+        self.file.close()
+        self.WriteMetadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+def ReadMetadata(path: str) -> dict:
+    try:
+        with open(path + '.json') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def Open(path: str, mode = 'r') -> tuple[np.ndarray, dict]:
+
+    """
+    Memory maps a capture.
+
+    Args:
+        path (str): Capture file.
+        mode (str): 'r' read only, 'r+' to modify in place.
+    Returns:
+        (tuple[numpy.ndarray, dict]): Records and sidecar metadata.
+    """
+
+    metadata = ReadMetadata(path)
+    dtype = RECORD
+    if "dtype" in metadata: # older captures have fewer fields
+        dtype = np.dtype([tuple(field) for field in metadata["dtype"]])
+    count = os.path.getsize(path)//dtype.itemsize # a partial last record (killed mid-write) is ignored
+    if count == 0:
+        return np.zeros(0, dtype=dtype), metadata
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(count,)), metadata
+
+def Chunks(path: str, chunk_size = 65536, overlap = 0):
+
+    """
+    Iterates over a capture in chunks of records, without loading the
+    whole file. With overlap > 0 each chunk also contains the last
+    `overlap` records of the previous one.
+
+    Yields:
+        (numpy.ndarray): RECORD rows (views of the memory map).
+    """
+
+    records, metadata = Open(path)
+    step = chunk_size
+    start = 0
+    while start < len(records):
+        yield records[max(start-overlap, 0):start+step]
+        start += step
+
+def Acquire(sensor: object, n: int) -> np.ndarray:
+
+    """
+    Reads n samples with ReadRaw and returns them as a RECORD batch.
+    """
+
+    rows = []
+    for i in range(n):
+        sensor.ReadRaw()
+        rows.append(SensorRow(sensor))
+    return np.array(rows, dtype=RECORD)
+
+def ApplyCalibration(records: np.ndarray, torque: Calibration, rpm: Calibration) -> np.ndarray:
+
+    """
+    Recomputes the torque and rpm columns of a batch from its counts (in place).
+    """
+
+    records['torque'] = torque.ApplyArray(records['torque_counts'])
+    records['rpm'] = rpm.ApplyArray(records['rpm_counts'])
+    return records
+
+def Recalibrate(path: str, torque: Calibration, rpm: Calibration,
+                output: str|None = None, chunk_size = 1 << 20) -> None:
+
+    """
+    Re-calibrates a recorded capture chunk by chunk.
+
+    Args:
+        path (str): Capture to convert.
+        torque, rpm (Calibration): New calibrations.
+        output (str, optional): Destination capture. In place when omitted.
+        chunk_size (int): Records converted at a time.
+    """
+
+    metadata = ReadMetadata(path)
+    metadata["torque_calibration"] = torque.ToDict()
+    metadata["rpm_calibration"] = rpm.ToDict()
+    if output == None:
+        records, _ = Open(path, mode='r+')
+        for start in range(0, len(records), chunk_size):
+            ApplyCalibration(records[start:start+chunk_size], torque, rpm)
+        if isinstance(records, np.memmap): records.flush()
+        del records
+        with open(path + '.json', 'w') as file:
+            json.dump(metadata, file, indent=1)
+        return
+    with CaptureWriter(output, metadata=metadata) as writer:
+        for chunk in Chunks(path, chunk_size):
+            writer.AppendRecords(ApplyCalibration(np.array(chunk), torque, rpm))
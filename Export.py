@@ -0,0 +1,309 @@
+"""
+=======================================
+Columnar export to Parquet/HDF5 (:mod:`Export`)
+=======================================
+
+Writes the ReadRaw stream as compressed columnar files, one row group
+(Parquet) or dataset chunk (HDF5) per `row_group` samples. Rows are
+stored by the acquisition thread in a preallocated RECORD array (under
+a microsecond per row) and written by a background thread, so
+compression and disk I/O do not delay the readings, and only a few
+row groups are kept in memory at any time.
+
+    ♦ Parquet (.parquet, needs pyarrow): one column per RECORD field
+    ♦ HDF5 (.h5/.hdf5, needs h5py): one dataset per RECORD field
+
+The sensor configuration (Tm_max, Rpm_max, byte_resolution,
+calibrations and, optionally, device configuration blocks) is stored
+as file metadata under the key "lcts" (JSON). Files can be rotated by
+size and/or age: run01.parquet -> run01_0000.parquet, run01_0001.parquet, ...
+
+    from Export import ExportWriter
+
+    with ExportWriter('run01.parquet', sensor, max_seconds=600, config_blocks=(0, 1)) as export:
+        export.Attach(sensor)
+        for i in range(1000000):
+            sensor.ReadRaw()
+    export.files # written files
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from Capture import RECORD, SensorMetadata, SensorRow, ToRecords
+
+FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.h5': 'hdf5', '.hdf5': 'hdf5'}
+
+class ParquetFile:
+
+    def __init__(self, path: str, metadata: dict, compression: str|None = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)") from None
+        self.pa = pa
+        self.path = path
+        fields = [pa.field(name, pa.from_numpy_dtype(RECORD[name])) for name in RECORD.names]
+        self.schema = pa.schema(fields, metadata={"lcts": json.dumps(metadata)})
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression or 'zstd')
+
+    def Write(self, records: np.ndarray) -> None:
+        table = self.pa.Table.from_arrays([records[name] for name in RECORD.names], schema=self.schema)
+        self.writer.write_table(table, row_group_size=len(records))
+
+    def Size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def Close(self) -> None:
+        self.writer.close()
+
+class HDF5File:
+
+    def __init__(self, path: str, metadata: dict, compression: str|None = None, chunk = 65536):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("HDF5 export needs h5py (pip install h5py)") from None
+        self.path = path
+        self.file = h5py.File(path, 'w')
+        self.file.attrs["lcts"] = json.dumps(metadata)
+        self.count = 0
+        for name in RECORD.names:
+            self.file.create_dataset(name, shape=(0,), maxshape=(None,), dtype=RECORD[name],
+                                     chunks=(chunk,), compression=compression or 'gzip', shuffle=True)
+
+    def Write(self, records: np.ndarray) -> None:
+        start = self.count
+        self.count += len(records)
+        for name in RECORD.names:
+            dataset = self.file[name]
+            dataset.resize((self.count,))
+            dataset[start:] = records[name]
+        self.file.flush()
+
+    def Size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def Close(self) -> None:
+        self.file.attrs["count"] = self.count
+        self.file.close()
+
+class ExportWriter:
+
+    def __init__(self, path: str, sensor: object = None, metadata: dict|None = None,
+                 format: str|None = None, compression: str|None = None, row_group = 65536,
+                 max_bytes: int|None = None, max_seconds: float|None = None,
+                 config_blocks = (), queue_size = 16):
+
+        """
+        Args:
+            path (str): Output file; with rotation the files are <name>_<n><ext>.
+            sensor (Torquimeter, optional): Its configuration is stored as metadata.
+            metadata (dict, optional): Extra metadata entries.
+            format (str, optional): 'parquet' or 'hdf5', from the extension by default.
+            compression (str, optional): Codec, 'zstd' for Parquet and 'gzip' for HDF5 by default.
+            row_group (int): Samples per row group written.
+            max_bytes (int, optional): Starts a new file once the current one reaches this size.
+            max_seconds (float, optional): Starts a new file once the current one is this old.
+            config_blocks (tuple[int]): Device configuration blocks (ReadConfig) read from
+                                        the sensor now and stored as metadata (hex).
+            queue_size (int): Row groups waiting to be written before Append blocks.
+        """
+
+        stem, extension = os.path.splitext(path)
+        if format == None:
+            if extension.lower() not in FORMATS:
+                raise ValueError("unknown export format %r, use .parquet or .h5" % extension)
+            format = FORMATS[extension.lower()]
+        if format not in ('parquet', 'hdf5'):
+            raise ValueError("format must be 'parquet' or 'hdf5'")
+        self.path = path
+        self.stem = stem
+        self.extension = extension
+        self.format = format
+        self.compression = compression
+        self.row_group = row_group
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.metadata = {"created": time.time()}
+        if sensor != None:
+            self.metadata.update(SensorMetadata(sensor))
+            blocks = {}
+            for block in config_blocks:
+                reply = sensor.ReadConfig(block, tries=3)
+                blocks[str(block)] = reply.data.hex() if hasattr(reply, "data") else None
+            if blocks: self.metadata["config_blocks"] = blocks
+        if metadata != None:
+            self.metadata.update(metadata)
+        self.metadata.update({"format": "LCTS export", "version": 1,
+                              "dtype": [list(field) for field in RECORD.descr]})
+        self.rows = np.empty(row_group, dtype=RECORD) # row group being filled
+        self.filled = 0 # rows used in self.rows
+        self.count = 0 # samples handed to the writer thread
+        self.deadline = None if max_seconds == None else time.monotonic() + max_seconds # next time rotation
+        self.files = [] # paths of the files written
+        self.sensors = [] # attached sensors, detached by Close
+        self.error = None # exception raised by the writer thread
+        self.file = None
+        self.Open() # in this thread: a missing library or a bad path fails here
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.Run, name="ExportWriter", daemon=True)
+        self.thread.start()
+
+    def Open(self) -> None:
+        if self.max_bytes == None and self.max_seconds == None:
+            path = self.path
+        else:
+            path = "%s_%04d%s" % (self.stem, len(self.files), self.extension)
+        metadata = dict(self.metadata, part=len(self.files))
+        if self.format == 'parquet':
+            self.file = ParquetFile(path, metadata, self.compression)
+        else:
+            self.file = HDF5File(path, metadata, self.compression, self.row_group)
+        self.files.append(path)
+
+    def Run(self) -> None:
+
+        """
+        Writer thread: writes the queued row groups and rotates the files.
+        """
+
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None: break
+                if self.error != None: continue # drain, the error is raised by the producer
+                records, rotate = item
+                if self.file == None: self.Open()
+                if len(records): self.file.Write(records)
+                if rotate or (self.max_bytes != None and self.file.Size() >= self.max_bytes):
+                    self.file.Close()
+                    self.file = None # the next file is opened with the next row group
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+        try:
+            if self.file != None: self.file.Close()
+        except Exception as error:
+            if self.error == None: self.error = error
+        self.file = None
+
+    def CheckError(self) -> None:
+        if self.error != None:
+            raise RuntimeError("export writer failed: %s" % self.error) from self.error
+
+    def Attach(self, sensor: object) -> None:
+
+        """
+        Exports every new ReadRaw sample of the sensor, until Detach or Close.
+        """
+
+        sensor.listeners.append(self.Update)
+        self.sensors.append(sensor)
+
+    def Detach(self, sensor: object) -> None:
+        if self.Update in sensor.listeners:
+            sensor.listeners.remove(self.Update)
+        if sensor in self.sensors:
+            self.sensors.remove(sensor)
+
+    def Update(self, sensor: object) -> None:
+        self.AppendRow(SensorRow(sensor))
+
+    def Append(self, sensor: object, t: float|None = None) -> None:
+
+        """
+        Appends the last sample read by the sensor.
+        """
+
+        self.AppendRow(SensorRow(sensor, t))
+
+    def AppendRow(self, row: tuple) -> None:
+        self.rows[self.filled] = row
+        self.filled += 1
+        if self.deadline != None and time.monotonic() >= self.deadline:
+            self.Flush(rotate=True) # a shorter row group ends the file on time
+        elif self.filled >= self.row_group:
+            self.Flush()
+
+    def AppendRecords(self, records) -> None:
+
+        """
+        Appends an array of RECORD rows (e.g. Capture.Open, converted from older captures).
+        """
+
+        self.Flush()
+        records = ToRecords(records)
+        for start in range(0, len(records), self.row_group):
+            self.Put(np.array(records[start:start+self.row_group]))
+
+    def Put(self, records: np.ndarray, rotate = False) -> None:
+        self.CheckError()
+        if self.Closed():
+            raise ValueError("export writer is closed")
+        if not rotate and self.deadline != None and time.monotonic() >= self.deadline:
+            rotate = True
+        if rotate and self.deadline != None:
+            self.deadline = time.monotonic() + self.max_seconds
+        self.queue.put((records, rotate)) # blocks when the writer falls queue_size row groups behind
+        self.count += len(records)
+
+    def Closed(self) -> bool:
+        return not self.thread.is_alive()
+
+    def Flush(self, rotate = False) -> None:
+
+        """
+        Hands the rows collected so far to the writer thread as a (shorter) row group.
+
+        Args:
+            rotate (bool): Starts a new file after this row group.
+        """
+
+        if self.filled or rotate:
+            records = self.rows[:self.filled]
+            self.rows = np.empty(self.row_group, dtype=RECORD)
+            self.filled = 0
+            self.Put(records, rotate)
+
+    def Close(self) -> None:
+
+        """
+        Detaches the sensors, writes the remaining rows, waits for the
+        writer thread and closes the file.
+        """
+
+        for sensor in list(self.sensors): self.Detach(sensor)
+        if self.Closed(): return
+        try:
+            self.Flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+        self.CheckError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+def ReadMetadata(path: str) -> dict:
+
+    """
+    Metadata stored in an exported file.
+    """
+
+    if FORMATS.get(os.path.splitext(path)[1].lower()) == 'hdf5':
+        import h5py
+        with h5py.File(path, 'r') as file:
+            return json.loads(file.attrs["lcts"])
+    import pyarrow.parquet as pq
+    return json.loads(pq.read_schema(path).metadata[b"lcts"])
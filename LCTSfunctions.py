@@ -15,7 +15,7 @@ High-Level Flowchart (:mod:`Torquimeter Communication Process`):
     3.  C --> D[Send Telegram (Methods.SendTelegram)];
     4.  D --> E{Set isReceiving to True};
     5.  E --> F{Loop while isReceiving};
-    6.  F --> G{Read from Serial Port (Methods.ReadFrom)};
+    6.  F --> G{Read a frame from Serial Port (FrameReader.Next)};
     7.  G --> H{Is code_received None?};
     8.  H -- Yes --> I{Set isReceiving to False};
     9.  I --> J{Return None};
@@ -42,6 +42,10 @@ Telegram format:
 """
 
 import serial
+from time import perf_counter, perf_counter_ns, time
+from dataclasses import dataclass
+from enum import IntEnum
+from Calibration import Calibration
 
 # BytearrayCommands Bytes
 STX =                           0x02
@@ -57,6 +61,14 @@ SCMD_WriteConfig =              0x46
 SCMD_RestartDevice  =           0x4B
 SCMD_GotoSpecialMode =          0x5a
 
+# SCMD_GotoSpecialMode parameters (check the manual of the device, they can differ)
+SPECIAL_MODE_OFF =              0x00 # back to request/response
+SPECIAL_MODE_CONTINUOUS =       0x01 # device sends ReadRaw replies without requests
+STREAMED_FRAMES_SKIPPED = 256 # streamed ReadRaw frames a Transaction read skips (continuous mode)
+
+BITS_PER_BYTE = 10 # start + 8 data + stop (8N1)
+ANCHOR_INTERVAL = 60.0 # s between re-readings of the wall clock for the sample timestamps
+
 class Torquimeter:
 
     def __init__(self ,Port:str, Tm_max = 100, Rpm_max = 30000, 
@@ -69,6 +81,9 @@ class Torquimeter:
         self.Tm_max = Tm_max # device max torque
         self.Rpm_max = Rpm_max # device max rpm
         self.byte_resolution = byte_resolution # max value in bytes
+        # counts -> N.m / RPM, replace to apply a lab correction curve
+        self.torque_calibration = Calibration(Tm_max, byte_resolution)
+        self.rpm_calibration    = Calibration(Rpm_max, byte_resolution)
         #last read values
         self.data = []
         self.MesurementChannel_0 = 0.0
@@ -76,6 +91,22 @@ class Torquimeter:
         self.Torque_calibrated   = 0.0
         self.RPM_calibrated      = 0.0
         self.FullstrokeFlag      = 0.0
+        self.timestamp           = 0.0 # epoch (s) of the last sample, see ReadRaw
+        self.latency = 0.0 # extra fixed delay (s) of adapter/device subtracted from the timestamps
+        self.epoch_offset = 0.0 # perf_counter -> epoch seconds, see Anchor
+        self.anchored = 0.0 # perf_counter of the last Anchor
+        self.Anchor()
+        self.tracer = None # Tracing.Tracer, records the stages of each request when set
+        self.listeners = [] # callables(sensor) run after each new ReadRaw sample
+        self.continuous = False # True while the device streams ReadRaw replies (StartContinuous)
+        self.reader = FrameReader(self.serialport) # buffered, resynchronizing frame reader
+        # link settings (see AutoTune)
+        self.gap = 0.0 # min silence (s) between a reply and the next telegram
+        self.last_reply = 0.0 # perf_counter of the end of the last read
+        # retry policy results
+        self.status = SampleStatus.MISSING # label of the last ReadRaw sample
+        self.retries = 0 # requests re-issued by ReadRaw
+        self.missing = 0 # ReadRaw calls that returned no new sample
 
     def ReadRaw(self, tries = 1) -> list|None:
 
@@ -83,44 +114,83 @@ class Torquimeter:
         Sensors send the latest calibrated and uncalibrated measurement values. 
         Used for calibrating the sensor or measuring in normal mode.
         With sensors or interfaces using one channel only both channels have the same value.
+        In continuous mode (StartContinuous) no request is sent, the next
+        frame streamed by the device is read.
+        Replies that arrive late for an earlier request are discarded, and a
+        missing or corrupted reply makes it re-send the request, up to `tries` times.
 
         Args:
-            (None)
+            tries (int): Max requests sent for this sample.
         Returns:
             (list): MesurementChannel_0,MesurementChannel_1,
                     Torque_calibrated,RPM_calibrated,
-                    FullstrokeFlag, Overloadflag]
+                    FullstrokeFlag, Overloadflag, status, timestamp]
+                    status (SampleStatus) is FRESH, RETRIED or MISSING;
+                    when MISSING the previous values are repeated.
+                    timestamp (float) is the host receive time (epoch s)
+                    minus the line time of the reply, of the bytes queued
+                    behind it and `latency`.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.ReadRaw()) #sends the command "ReadRaw"
+        tracer = self.tracer
+        if tracer != None: t_start = perf_counter_ns()
+        continuous = self.continuous
+        reader = self.reader
         self.isReceiving = True
         data = None
-        for attempt in range(tries): #loop for receiving
+        for attempt in range(tries): # each attempt re-issues the request (polling)
+            if tracer != None: t0 = perf_counter_ns()
+            if not continuous: # in continuous mode the device sends without being asked
+                reader.MarkStale() # bytes already received answer older requests
+                if self.gap: self.WaitGap()
+                Methods.SendTelegram(self.serialport,BytearrayCommands.ReadRaw()) #sends the command "ReadRaw"
+                if tracer != None: t1 = perf_counter_ns(); tracer.Record("SendTelegram", t0, t1); t0 = t1
             try:
-                code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            #print(code_received)
-            if code_received != None:
+                command_para = reader.Next(tracer)
+            except serial.SerialException: raise
+            except Exception: command_para = None
+            self.last_reply = perf_counter()
+            if tracer != None: t1 = perf_counter_ns(); tracer.Record("ReadFrom", t0, t1); t0 = t1
+            if command_para != None and command_para[0] == SCMD_ReadRaw:
                 try:
-                    Data = Methods.TransformData(Methods.GetRaw(Methods.ReceiveTg(code_received)))
-                    self.Overloadflag = Data[1]
+                    RawData = Methods.GetRaw(command_para)
+                    if tracer != None: t1 = perf_counter_ns(); tracer.Record("GetRaw", t0, t1); t0 = t1
+                    Data = Methods.TransformData(RawData)
+                    if tracer != None: t1 = perf_counter_ns(); tracer.Record("TransformData", t0, t1); t0 = t1
                     data = Data[0]
-                except:data = None
-                if data != None: 
-                    self.data = data
-                    self.MesurementChannel_0 = data[0]
-                    self.MesurementChannel_1 = data[1]
-                    self.Torque_calibrated   = data[2]*self.Tm_max/self.byte_resolution #TORQUE
-                    self.RPM_calibrated      = data[3]*self.Rpm_max/self.byte_resolution #RPM
-                    self.FullstrokeFlag      = data[4]
-                else: data = None
-            else: data = None
+                except Exception: data = None
+            if data != None:
+                self.Overloadflag = Data[1]
+                self.data = data
+                self.MesurementChannel_0 = data[0]
+                self.MesurementChannel_1 = data[1]
+                self.Torque_calibrated   = self.torque_calibration.Apply(data[2]) #TORQUE
+                self.RPM_calibrated      = self.rpm_calibration.Apply(data[3]) #RPM
+                self.FullstrokeFlag      = data[4]
+                # receive time minus the line time of the reply and of the bytes
+                # already received after it (frames queued while the host was busy)
+                if self.last_reply - self.anchored >= ANCHOR_INTERVAL: self.Anchor()
+                queued = reader.frame_size + len(reader.buffer) + self.serialport.in_waiting
+                self.timestamp           = (self.last_reply + self.epoch_offset - self.latency
+                                            - queued*BITS_PER_BYTE/self.serialport.baudrate)
+                if attempt and not continuous: # a request was re-issued
+                    self.status = SampleStatus.RETRIED
+                    self.retries += attempt
+                else:
+                    self.status = SampleStatus.FRESH
+                for listener in self.listeners: listener(self)
+                break
+        else:
+            self.status = SampleStatus.MISSING # the previous values are returned again
+            if not continuous: self.retries += tries-1
+            self.missing += 1
         self.isReceiving = False 
+        if tracer != None: tracer.Record("ReadRaw", t_start, perf_counter_ns())
         return (self.MesurementChannel_0,self.MesurementChannel_1,
                     self.Torque_calibrated,self.RPM_calibrated,
-                    self.FullstrokeFlag, self.Overloadflag)
+                    self.FullstrokeFlag, self.Overloadflag, self.status, self.timestamp)
     
-    def Hello(self, tries = 1) -> list|None:
+    def Hello(self, tries = 1) -> "HelloReply|Reply|None":
 
         """
         Sensors can be configured to send this message after power up.
@@ -131,26 +201,12 @@ class Torquimeter:
         Args:
             (None)
         Returns:
-            (list)    
+            (HelloReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.Hello())
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.Hello(), tries)
 
-    def ReadStatus(self, tries = 1) -> list|None: 
+    def ReadStatus(self, tries = 1) -> "StatusReply|Reply|None":
       
         """
         Send a detailed status report. 
@@ -160,26 +216,12 @@ class Torquimeter:
         Args:
             (None)
         Returns:
-            (list)    
+            (StatusReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.ReadStatus())
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.ReadStatus(), tries)
     
-    def ReadStatusShort(self, tries = 1) -> list|None:
+    def ReadStatusShort(self, tries = 1) -> "StatusShortReply|Reply|None":
         
         """
         Send a short version of the status report. 
@@ -188,26 +230,12 @@ class Torquimeter:
             (None)
 
         Returns:
-            (list)
+            (StatusShortReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.ReadStatusShort())
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.ReadStatusShort(), tries)
         
-    def ReadConfig(self, parameter: int, tries = 1) -> list|None: # parameter: Block number
+    def ReadConfig(self, parameter: int, tries = 1) -> "ConfigReply|Reply|None": # parameter: Block number
         
         """
         Reads a configuration block. 
@@ -217,26 +245,12 @@ class Torquimeter:
             parameter (int): Block number.
 
         Returns:
-            (list)
+            (ConfigReply): Decoded reply, None if nothing valid was received.
         """
         
-        Methods.SendTelegram(self.serialport,BytearrayCommands.ReadConfig(parameter))
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.ReadConfig(parameter), tries)
         
-    def WriteConfig(self, parameter: list[int], tries = 1)->list|None: #parameter: Block number + 32 bytes
+    def WriteConfig(self, parameter: list[int], tries = 1) -> "AckReply|NackReply|Reply|None": #parameter: Block number + 32 bytes
         
         """
         Writes a configuration block. 
@@ -246,26 +260,12 @@ class Torquimeter:
             parameters (list[int]): Block number + 32 bytes.
 
         Returns:
-            (list)
+            (AckReply or NackReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.WriteConfig(parameter))
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.WriteConfig(parameter), tries)
         
-    def WriteFullStroke(self, parameter: bool, tries = 1)->list|None: #parameter: on/off
+    def WriteFullStroke(self, parameter: bool, tries = 1) -> "AckReply|NackReply|Reply|None": #parameter: on/off
         
         """
         Sets the sensor into the check mode where it sends a 100% signal.
@@ -275,26 +275,12 @@ class Torquimeter:
         Args:
             (bool): On or Off.
         Returns:
-            (list)
+            (AckReply or NackReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.WriteFullStroke(parameter))
-        self.isReceiving = True
-        data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
-                try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
-                    data = None
-            else: data = None
-        self.isReceiving = False 
-        return data
+        return self.Transaction(BytearrayCommands.WriteFullStroke(parameter), tries)
         
-    def RestartDevice(self, tries = 1) -> list|None:
+    def RestartDevice(self, tries = 1) -> "HelloReply|Reply|None":
 
         """
         Resets the device. It responses with a 'hello' 
@@ -303,24 +289,174 @@ class Torquimeter:
         Args:
             (None)
         Returns:
-            (list)
+            (HelloReply): Decoded reply, None if nothing valid was received.
+        """
+
+        return self.Transaction(BytearrayCommands.RestartDevice(), tries)
+
+    def GotoSpecialMode(self, parameter: int, tries = 1) -> "AckReply|NackReply|Reply|None":
+
+        """
+        Switches the device to a special mode.
+        Use StartContinuous/StopContinuous for the continuous output mode.
+
+        Args:
+            parameter (int): Mode byte (SPECIAL_MODE_*).
+        Returns:
+            (AckReply or NackReply): Decoded reply, None if nothing valid was received.
         """
 
-        Methods.SendTelegram(self.serialport,BytearrayCommands.RestartDevice())
+        return self.Transaction(BytearrayCommands.GotoSpecialMode(parameter), tries)
+
+    def StartContinuous(self, mode = SPECIAL_MODE_CONTINUOUS, tries = 3) -> bool:
+
+        """
+        Asks the device to stream ReadRaw replies continuously, so each
+        sample only needs the reply leg of the half-duplex line.
+        ReadRaw and Stream then only receive. Devices that answer with
+        NACK (or do not answer) stay in polling mode. If the device answers
+        with its first streamed ReadRaw reply instead of an ACK, that
+        sample is kept for the next ReadRaw.
+
+        Args:
+            mode (int): Mode byte sent with SCMD_GotoSpecialMode.
+            tries (int): Frames read while waiting for the answer.
+        Returns:
+            (bool): True if the device entered the continuous mode.
+        """
+
+        reader = self.reader
+        reader.MarkStale()
+        if self.gap: self.WaitGap()
+        Methods.SendTelegram(self.serialport,BytearrayCommands.GotoSpecialMode(mode))
+        self.isReceiving = True
+        reply = None
+        streaming = False
+        for attempt in range(tries):
+            try:command_para = reader.Next()
+            except serial.SerialException: raise
+            except Exception: command_para = None
+            self.last_reply = perf_counter()
+            if command_para == None: continue
+            if command_para[0] == SCMD_ReadRaw: # no ACK, the device is already streaming
+                reader.Unread(command_para) # first sample, returned by the next ReadRaw
+                streaming = True
+                break
+            try: reply = Methods.DecodeTg(command_para)
+            except Exception: reply = None
+            if reply != None: break
+        self.isReceiving = False
+        self.continuous = streaming or isinstance(reply, AckReply)
+        return self.continuous
+
+    def StopContinuous(self, tries = 10) -> bool:
+
+        """
+        Returns the device to request/response mode and discards the
+        frames that were still streaming.
+
+        Args:
+            tries (int): Frames read while waiting for the ACK.
+        Returns:
+            (bool): True if the device acknowledged.
+        """
+
+        Methods.SendTelegram(self.serialport,BytearrayCommands.GotoSpecialMode(SPECIAL_MODE_OFF))
+        self.isReceiving = True
+        acknowledged = False
+        for attempt in range(tries): # streamed frames can still arrive before the ACK
+            try:reply = Methods.DecodeTg(self.reader.Next())
+            except serial.SerialException: raise
+            except Exception: reply = None
+            if isinstance(reply, (AckReply, NackReply)):
+                acknowledged = isinstance(reply, AckReply)
+                break
+        self.serialport.reset_input_buffer()
+        self.reader.Clear()
+        self.isReceiving = False
+        self.continuous = False
+        return acknowledged
+
+    def Stream(self, count = None, tries = 1):
+
+        """
+        Generator of ReadRaw samples, receive-only in continuous mode and
+        polling otherwise.
+
+        Args:
+            count (int, optional): Number of samples, endless when None.
+        Yields:
+            (tuple): Same as ReadRaw.
+        """
+
+        n = 0
+        while count == None or n < count:
+            yield self.ReadRaw(tries)
+            n += 1
+
+    def Transaction(self, tg: bytearray, tries = 1) -> object|None:
+
+        """
+        Sends a telegram and waits for its reply, decoded by the
+        reply registry (see Methods.DecodeTg). ReadRaw frames are not
+        replies to these commands: in continuous mode the streamed
+        samples received meanwhile are skipped (and lost).
+
+        Args:
+            tg (bytearray): Telegram built by BytearrayCommands.
+            tries (int): Number of reads before giving up.
+        Returns:
+            (object): Decoded reply, None if nothing valid was received.
+        """
+
+        tracer = self.tracer
+        if tracer != None: t_start = t0 = perf_counter_ns()
+        reader = self.reader
+        reader.MarkStale()
+        if self.gap: self.WaitGap()
+        Methods.SendTelegram(self.serialport,tg)
+        if tracer != None: t1 = perf_counter_ns(); tracer.Record("SendTelegram", t0, t1); t0 = t1
         self.isReceiving = True
         data = None
-        for attempt in range(tries): #loop for receiving
-            try:code_received=Methods.ReadFrom(self.serialport)
-            except: code_received = None
-            if code_received != None:
+        for attempt in range(tries): # only reads again, commands are not always safe to repeat
+            for skipped in range(STREAMED_FRAMES_SKIPPED+1):
+                try:command_para = reader.Next(tracer)
+                except serial.SerialException: raise
+                except Exception: command_para = None
+                if command_para == None or command_para[0] != SCMD_ReadRaw: break
+                command_para = None # streamed sample, not the reply
+            self.last_reply = perf_counter()
+            if tracer != None: t1 = perf_counter_ns(); tracer.Record("ReadFrom", t0, t1); t0 = t1
+            if command_para != None:
                 try:
-                    data = Methods.ReceiveTg(code_received)
-                    #Methods.TranslateData(data)
-                except:
+                    data = Methods.DecodeTg(command_para)
+                except Exception:
                     data = None
-            else: data = None
+                if data != None: break
         self.isReceiving = False 
+        if tracer != None: tracer.Record("Transaction", t_start, perf_counter_ns())
         return data
+
+    def Anchor(self) -> None:
+
+        """
+        Re-reads the wall clock used for the sample timestamps. Called by
+        ReadRaw every ANCHOR_INTERVAL seconds, so long runs follow the
+        system clock (NTP) and can be compared with logs of other hosts.
+        """
+
+        self.anchored = perf_counter()
+        self.epoch_offset = time() - self.anchored
+
+    def WaitGap(self) -> None:
+
+        """
+        Waits until `gap` seconds have passed since the last read.
+        Busy waits, sleep() is too coarse for sub-millisecond gaps.
+        """
+
+        deadline = self.last_reply + self.gap
+        while perf_counter() < deadline: pass
     
 
 #metodos para manipulacao do telegram
@@ -438,27 +574,29 @@ class Methods:
             FullstrokeFlag]
         """
 
-        global SCMD_ReadRaw
         if command_para == None: return None
-        command = command_para[0]
-        
-        # Transforma em hex e garante 2 digitos para cada byte
-        params = [hex(p)[2:].zfill(2) for p in command_para[1]]
-        
-        if command == SCMD_ReadRaw:
-            # Concatena os pares de bytes corretamente
-            MesurementChannel_0 = int(params[0] + params[1], 16)
-            MesurementChannel_1 = int(params[2] + params[3], 16)
-            CalibratedValCha_0  = int(params[4] + params[5], 16)
-            CalibratedValCha_1  = int(params[6] + params[7], 16)
-            FullstrokeFlag      = int(params[8], 16)
-            
-            RawData = [MesurementChannel_0, MesurementChannel_1,
-                    CalibratedValCha_0, CalibratedValCha_1,
-                    FullstrokeFlag]
-            return RawData
+        if command_para[0] == SCMD_ReadRaw:
+            return Replies.ReadRaw(command_para[1])
         return None
     
+    def DecodeTg(command_para:list[int,list[int]]) -> object|None:
+        """
+        Decodes the output of ReceiveTg into a reply object using the
+        decoder registered for the command byte (see DECODERS).
+        Commands without a decoder are returned as a generic Reply.
+
+        Args:
+            (list[int,list[int]]): List with the received command and parameters list
+        Returns:
+            (object): Decoded reply or None
+        """
+
+        if command_para == None: return None
+        decoder = DECODERS.get(command_para[0])
+        if decoder == None:
+            return Reply(command_para[0], tuple(command_para[1]))
+        return decoder(command_para[1])
+
     def Unstuff(tg: bytearray) -> list:
         """
         Removes the byte stuffing from the received telegram. 
@@ -483,13 +621,14 @@ class Methods:
                 skip = True
         return unstuffed
 
-    def ReceiveTg(code_received: bytearray) -> list:
+    def ReceiveTg(code_received: bytearray, tracer = None) -> list:
         """
         Processes the received bytearray, handles byte stuffing, 
         and validates checksums before extracting the command and parameters.
 
         Args:
             code_received (bytearray): Bytearray read from the serial port.
+            tracer (Tracing.Tracer, optional): Records the Unstuff and Checksums stages.
         Returns:
             (list[int, list[int]]): Command and unstuffed parameters list.
         """
@@ -507,22 +646,173 @@ class Methods:
             return None
 
         # 2. Faz o Unstuffing (importante para o Checksum bater!)
+        if tracer != None: t0 = perf_counter_ns()
         clean_data = Methods.Unstuff(tg_to_process)
+        if tracer != None: t1 = perf_counter_ns(); tracer.Record("Unstuff", t0, t1)
         
         # 3. Valida Checksum sobre os dados desdobrados
         # Os últimos dois bytes são sempre os checksums
         payload = clean_data[:-2]
         received_cs = clean_data[-2:]
         
-        if Methods.CalcChecksums(payload) == received_cs:
+        valid = Methods.CalcChecksums(payload) == received_cs
+        if tracer != None: tracer.Record("Checksums", t1, perf_counter_ns())
+        if valid:
             command = clean_data[0]
             num_params = clean_data[3]
             parameters = clean_data[4:4+num_params]
             return [command, parameters]
         else:
-            print(f"BAD CHECK SUMS: {clean_data}")
             return None
 
+class FrameReader:
+
+    """
+    Buffered telegram reader. Frames are cut using the parameter count of
+    the header, so only the bytes that cannot belong to a valid frame are
+    discarded, and whatever follows a frame stays buffered for the next one.
+    """
+
+    def __init__(self, SerialPort: object):
+        self.serialport = SerialPort
+        self.buffer = bytearray()
+        self.stale_end = 0 # buffer[:stale_end] was received before the last request
+        self.chunk_size = None # max bytes per serial read (see AutoTune)
+        self.frame_size = 0 # bytes on the line of the last frame returned
+        self.pending = None # frame handed back with Unread, returned first by Next
+        # link health
+        self.timeouts = 0 # Next() calls that ended without a frame
+        self.checksum_errors = 0 # candidate frames rejected by the checksum
+        self.stale_frames = 0 # late replies to earlier requests
+        self.garbage_bytes = 0 # bytes discarded while resynchronizing
+
+    def Clear(self) -> None:
+        self.buffer.clear()
+        self.stale_end = 0
+        self.pending = None
+
+    def Unread(self, command_para: list) -> None:
+
+        """
+        Hands back a frame returned by Next, so the next call returns it again.
+        """
+
+        self.pending = command_para
+
+    def MarkStale(self) -> None:
+
+        """
+        To be called right before sending a request: every byte received
+        until now (a late or partial reply) belongs to earlier requests.
+        """
+
+        waiting = self.serialport.in_waiting
+        if waiting: self.buffer += self.serialport.read(waiting)
+        self.stale_end = len(self.buffer)
+
+    def Fill(self, size: int) -> bool:
+
+        """
+        Reads at least `size` bytes (or what arrives before the timeout).
+        """
+
+        size = max(size, self.serialport.in_waiting)
+        if self.chunk_size != None: size = min(size, self.chunk_size)
+        data = self.serialport.read(size)
+        if not data: return False
+        self.buffer += data
+        return True
+
+    def Drop(self, size: int, garbage = True) -> None:
+        del self.buffer[:size]
+        self.stale_end = max(self.stale_end - size, 0)
+        if garbage: self.garbage_bytes += size
+
+    def FrameEnd(self) -> int:
+
+        """
+        Length of the frame at the start of the buffer (which begins with
+        STX STX <command>), counting the byte stuffing.
+
+        Returns:
+            (int): Frame length; 0 if incomplete; -i if a lone STX at
+                   index i breaks the frame (a new frame starts there).
+        """
+
+        buffer = self.buffer
+        if len(buffer) < 6: return 0
+        end = 8 + buffer[5] # STX STX command rx tx n params checksum wchecksum
+        if buffer.find(STX, 2, end) < 0: # fast path, no stuffing
+            return end if len(buffer) >= end else 0
+        pos = 2
+        count = 0 # unstuffed bytes after the STXs
+        need = 4
+        while count < need:
+            if pos >= len(buffer): return 0
+            if buffer[pos] == STX:
+                if pos+1 >= len(buffer): return 0
+                if buffer[pos+1] != STX: return -pos # STX inside a frame must be doubled
+                pos += 2
+            else:
+                pos += 1
+            count += 1
+            if count == 4: need = 6 + buffer[pos-1] # header + params + checksums
+        return pos
+
+    def Next(self, tracer = None) -> list|None:
+
+        """
+        Returns the next valid, non stale frame.
+
+        Returns:
+            (list[int, list[int]]): Command and parameters (as ReceiveTg),
+                                    None if the timeout expired first.
+        """
+
+        if self.pending != None:
+            command_para = self.pending
+            self.pending = None
+            return command_para
+        buffer = self.buffer
+        while True:
+            # 1. cabecalho STX STX <command>, descarta o que vier antes
+            start = buffer.find(b'\x02\x02')
+            while start >= 0 and start+2 < len(buffer) and buffer[start+2] == STX:
+                start += 1 # runs of STX: the header uses the last two
+            if start < 0 or start+2 >= len(buffer):
+                keep = 0 # trailing STXs can be the start of a header
+                while keep < min(len(buffer), 2) and buffer[len(buffer)-1-keep] == STX: keep += 1
+                if start >= 0: keep = len(buffer)-start
+                if len(buffer) > keep: self.Drop(len(buffer)-keep)
+                if not self.Fill(3-min(keep, 2)):
+                    self.timeouts += 1
+                    return None
+                continue
+            if start: self.Drop(start)
+            # 2. frame completo?
+            end = self.FrameEnd()
+            if end == 0:
+                missing = 6-len(buffer) if len(buffer) < 6 else max(8+buffer[5]-len(buffer), 1)
+                if not self.Fill(missing):
+                    self.timeouts += 1 # partial frame stays buffered, MarkStale handles it
+                    return None
+                continue
+            if end < 0: # truncated frame followed by a new one
+                self.Drop(-end)
+                continue
+            stale = self.stale_end > 0
+            command_para = Methods.ReceiveTg(bytes(buffer[:end]), tracer)
+            if command_para == None: # corrupted, or a false header inside garbage
+                self.checksum_errors += 1
+                self.Drop(1)
+                continue
+            self.Drop(end, garbage=False)
+            self.frame_size = end
+            if stale:
+                self.stale_frames += 1
+                continue
+            return command_para
+
 class BytearrayCommands:
     
     def Hello() -> bytearray:
@@ -729,3 +1019,148 @@ class BytearrayCommands:
         telegram = list(telegram)
         telegram = bytearray(telegram+checksums) #transform the list of ints in a byte array for sending
         return telegram #return the telegram
+
+
+    def GotoSpecialMode(PARAMETER: int) -> bytearray: #parameter: mode
+
+        """
+        Switches the device to a special mode, e.g. continuous output.
+
+        Args:
+            (int): Mode byte (SPECIAL_MODE_*).
+        Returns:
+            (bytearray): The bytearray to be sent.
+        """
+
+        global STX, SCMD_GotoSpecialMode
+        rx      =   0x01 #receiver
+        tx      =   0xff #transmiter
+        command =   SCMD_GotoSpecialMode
+
+        # create the telegram to send
+        telegram = [STX,STX,command,rx,tx,0x01,PARAMETER]  #(stx,stx,command,rx,tx,number_of_parameters,parameter)
+        checksums = Methods.CalcChecksums(telegram[2:]) # calls function to calculate the check sums excluding stx
+        telegram = list(telegram)
+        telegram = bytearray(telegram+checksums) #transform the list of ints in a byte array for sending
+        return telegram #return the telegram
+
+class SampleStatus(IntEnum):
+    FRESH = 0   # answer to the first request
+    RETRIED = 1 # answer after re-sending the request
+    MISSING = 2 # no valid answer, previous values repeated
+
+# respostas decodificadas
+class ErrorCode(IntEnum):
+    ERROR_OK = 0 # not an error
+    ERROR_GENERIC = 1
+    ERROR_WATCHDOG = 2
+    ERROR_ROTOR_GENERIC = 3
+    ERROR_ROTOR_WRONG_SPEED = 4
+    ERROR_ROTOR_TOO_SLOW = 5
+    ERROR_ROTOR_TOO_FAST = 6
+    ERROR_ROTOR_NOT_COMPATIBLE = 7
+    ERROR_ROTOR_GOT_RESET = 8
+    ERROR_ROTOR_NOT_FOUND = 9
+    ERROR_ROTOR_UNSTABLE = 10
+    ERROR_ROTOR_TIMEOUT = 11
+    ERROR_ROTOR_GOT_NACK = 12
+    ERROR_ROTOR_BAD_CMD_ECHO = 13
+    ERROR_ROTOR_BAD_EE_WRITE = 14
+    ERROR_BAD_ROTOR_COMUNICATION = 15
+
+@dataclass(frozen=True, slots=True)
+class Reply:
+    command: int
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class AckReply:
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class NackReply:
+    error: ErrorCode|int
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class HelloReply:
+    error: ErrorCode|int
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class StatusReply:
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class StatusShortReply:
+    error: ErrorCode|int
+    parameters: tuple
+
+@dataclass(frozen=True, slots=True)
+class ConfigReply:
+    block: int
+    data: bytes
+
+_ERROR_CODES = tuple(ErrorCode)
+
+class Replies:
+
+    def Error(code: int) -> ErrorCode|int:
+
+        """
+        Maps an error byte to ErrorCode. Codes unknown to this
+        library are returned as plain ints.
+        """
+
+        if 0 <= code < len(_ERROR_CODES):
+            return _ERROR_CODES[code]
+        return code
+
+    def Ack(parameters: list[int]) -> AckReply:
+        return AckReply(tuple(parameters))
+
+    def Nack(parameters: list[int]) -> NackReply:
+        return NackReply(Replies.Error(parameters[0]) if parameters else ErrorCode.ERROR_GENERIC,
+                         tuple(parameters))
+
+    def Hello(parameters: list[int]) -> HelloReply:
+        return HelloReply(Replies.Error(parameters[0]) if parameters else ErrorCode.ERROR_OK,
+                          tuple(parameters))
+
+    def ReadStatus(parameters: list[int]) -> StatusReply:
+        return StatusReply(tuple(parameters))
+
+    def ReadStatusShort(parameters: list[int]) -> StatusShortReply:
+        return StatusShortReply(Replies.Error(parameters[0]) if parameters else ErrorCode.ERROR_OK,
+                                tuple(parameters))
+
+    def ReadConfig(parameters: list[int]) -> ConfigReply:
+        return ConfigReply(parameters[0], bytes(parameters[1:]))
+
+    def ReadRaw(parameters: list[int]) -> list[int]:
+
+        """
+        Concatenates the byte pairs of a ReadRaw reply.
+        The output still needs Methods.TransformData to be signed.
+
+        Returns:
+            RawData(list[int]): [MesurementChannel_0,MesurementChannel_1,
+            CalibratedValCha_0,CalibratedValCha_1,
+            FullstrokeFlag]
+        """
+
+        p = parameters
+        return [(p[0] << 8) | p[1], (p[2] << 8) | p[3],
+                (p[4] << 8) | p[5], (p[6] << 8) | p[7],
+                p[8]]
+
+# decoder registry, keyed by the command byte of the reply
+DECODERS = {
+    SCMD_ACK:               Replies.Ack,
+    SCMD_NACK:              Replies.Nack,
+    SCMD_Hello:             Replies.Hello,
+    SCMD_ReadRaw:           Replies.ReadRaw,
+    SCMD_ReadStatus:        Replies.ReadStatus,
+    SCMD_ReadStatusShort:   Replies.ReadStatusShort,
+    SCMD_ReadConfig:        Replies.ReadConfig,
+}
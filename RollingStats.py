@@ -0,0 +1,185 @@
+"""
+=======================================
+Rolling statistics over the live stream (:mod:`RollingStats`)
+=======================================
+
+Windowed mean, RMS, standard deviation, min and max of torque, RPM and
+mechanical power (torque x angular speed) over the last N samples.
+Every new ReadRaw sample updates the windows in O(1) (amortized for
+min/max), and queries are O(1), so they can be polled at kHz rates.
+
+    from RollingStats import RollingStats
+
+    stats = RollingStats(windows=(100, 1000, 10000))
+    stats.Attach(sensor)
+    while True:
+        sensor.ReadRaw()
+        torque_avg = stats.Mean('torque', 1000)
+        power_rms = stats.Rms('power', 100)
+
+Running sums are compensated (Neumaier summation), so adding and
+removing samples for hours does not accumulate floating point drift
+and no update ever re-sums the window.
+"""
+
+from collections import deque
+from math import pi, sqrt
+
+FIELDS = ('torque', 'rpm', 'power')
+RPM_TO_RAD_S = 2*pi/60
+
+class RollingWindow:
+
+    def __init__(self, length: int):
+
+        """
+        Args:
+            length (int): Number of samples in the window.
+        """
+
+        if length < 1:
+            raise ValueError("window length must be at least 1")
+        self.length = length
+        self.values = [0.0]*length # ring buffer
+        self.index = 0 # next position in the ring
+        self.count = 0 # samples added, saturates at length
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.error = 0.0 # Neumaier compensation of total
+        self.error_sq = 0.0 # Neumaier compensation of total_sq
+        self.shift = None # first sample; sums are of (x - shift), avoids cancellation in Std
+        self.seq = 0 # samples added since the start
+        self.maxima = deque() # (seq, value), values decreasing
+        self.minima = deque() # (seq, value), values increasing
+
+    def Add(self, x: float) -> None:
+        values = self.values
+        i = self.index
+        if self.shift == None: self.shift = x
+        shift = self.shift
+        if self.count == self.length:
+            old = values[i] - shift
+        else:
+            old = 0.0
+            self.count += 1
+        values[i] = x
+        self.index = i+1 if i+1 < self.length else 0
+        # Neumaier: adds the change (y - old) and keeps its rounding error apart
+        y = x - shift
+        total = self.total
+        for delta in (y, -old):
+            t = total + delta
+            if abs(total) >= abs(delta): self.error += (total - t) + delta
+            else: self.error += (delta - t) + total
+            total = t
+        self.total = total
+        total = self.total_sq
+        for delta in (y*y, -old*old):
+            t = total + delta
+            if abs(total) >= abs(delta): self.error_sq += (total - t) + delta
+            else: self.error_sq += (delta - t) + total
+            total = t
+        self.total_sq = total
+        seq = self.seq
+        maxima = self.maxima
+        while maxima and maxima[-1][1] <= x: maxima.pop()
+        maxima.append((seq, x))
+        if maxima[0][0] <= seq-self.length: maxima.popleft()
+        minima = self.minima
+        while minima and minima[-1][1] >= x: minima.pop()
+        minima.append((seq, x))
+        if minima[0][0] <= seq-self.length: minima.popleft()
+        self.seq = seq+1
+
+    def Clear(self) -> None:
+        self.__init__(self.length)
+
+    def Count(self) -> int:
+        return self.count
+
+    def Mean(self) -> float:
+        return self.shift + (self.total + self.error)/self.count if self.count else 0.0
+
+    def Rms(self) -> float:
+        if not self.count: return 0.0
+        mean = (self.total + self.error)/self.count # of x - shift
+        shift = self.shift
+        return sqrt(max((self.total_sq + self.error_sq)/self.count + 2*shift*mean + shift*shift, 0.0))
+
+    def Std(self) -> float:
+
+        """
+        Population standard deviation of the window.
+        """
+
+        if not self.count: return 0.0
+        mean = (self.total + self.error)/self.count
+        return sqrt(max((self.total_sq + self.error_sq)/self.count - mean*mean, 0.0))
+
+    def Min(self) -> float:
+        return self.minima[0][1] if self.minima else 0.0
+
+    def Max(self) -> float:
+        return self.maxima[0][1] if self.maxima else 0.0
+
+class RollingStats:
+
+    def __init__(self, windows = (100, 1000), fields = FIELDS):
+
+        """
+        Args:
+            windows (tuple[int]): Window lengths, in samples.
+            fields (tuple[str]): Any of 'torque' (N.m), 'rpm' and 'power' (W).
+        """
+
+        for field in fields:
+            if field not in FIELDS:
+                raise ValueError("unknown field %r, use one of %s" % (field, FIELDS))
+        self.fields = tuple(fields)
+        self.windows = {field: {length: RollingWindow(length) for length in windows}
+                        for field in fields}
+        # flat list for the per-sample update
+        self._updates = [(field, window.Add) for field in fields
+                         for window in self.windows[field].values()]
+
+    def Attach(self, sensor: object) -> None:
+
+        """
+        Updates the windows with every new ReadRaw sample of the sensor.
+        """
+
+        sensor.listeners.append(self.Update)
+
+    def Detach(self, sensor: object) -> None:
+        if self.Update in sensor.listeners:
+            sensor.listeners.remove(self.Update)
+
+    def Update(self, sensor: object) -> None:
+        self.Add(sensor.Torque_calibrated, sensor.RPM_calibrated)
+
+    def Add(self, torque: float, rpm: float) -> None:
+        sample = {'torque': torque, 'rpm': rpm, 'power': torque*rpm*RPM_TO_RAD_S}
+        for field, add in self._updates:
+            add(sample[field])
+
+    def Window(self, field: str, length: int) -> RollingWindow:
+        return self.windows[field][length]
+
+    def Mean(self, field: str, length: int) -> float:
+        return self.windows[field][length].Mean()
+
+    def Rms(self, field: str, length: int) -> float:
+        return self.windows[field][length].Rms()
+
+    def Std(self, field: str, length: int) -> float:
+        return self.windows[field][length].Std()
+
+    def Min(self, field: str, length: int) -> float:
+        return self.windows[field][length].Min()
+
+    def Max(self, field: str, length: int) -> float:
+        return self.windows[field][length].Max()
+
+    def Clear(self) -> None:
+        for windows in self.windows.values():
+            for window in windows.values(): window.Clear()
@@ -0,0 +1,224 @@
+"""
+=======================================
+Chunked spectral analysis of captures (:mod:`Spectral`)
+=======================================
+
+Spectral estimates of recorded torque/RPM (see :mod:`Capture`) computed
+chunk by chunk over the memory mapped file, so the memory used depends
+on chunk_size and nperseg, not on the length of the recording.
+
+    ♦ WelchPSD: averaged periodogram (Welch), optionally over a process pool
+    ♦ Spectrogram: generator of short-time spectra, one block per chunk
+    ♦ OrderSpectrum: RPM-synchronous spectrum (torque ripple per shaft order)
+
+    from Spectral import WelchPSD, OrderSpectrum
+
+    f, psd = WelchPSD('run01.lcts', fs=1000, nperseg=8192, processes=4)
+    orders, psd_orders = OrderSpectrum('run01.lcts', samples_per_rev=64)
+
+Segments use a periodic Hann window, mean removal and one-sided
+density scaling, matching scipy.signal.welch defaults.
+"""
+
+import numpy as np
+
+from Capture import Open, Chunks
+
+def Window(nperseg: int) -> np.ndarray:
+    return np.hanning(nperseg+1)[:-1] # periodic Hann
+
+def SegmentSpectra(x: np.ndarray, nperseg: int, step: int, window: np.ndarray) -> np.ndarray:
+
+    """
+    |FFT|^2 of every full segment of x starting at multiples of step.
+
+    Returns:
+        (numpy.ndarray): Shape (segments, nperseg//2+1).
+    """
+
+    if len(x) < nperseg:
+        return np.zeros((0, nperseg//2+1))
+    segments = np.lib.stride_tricks.sliding_window_view(x, nperseg)[::step]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(segments*window, axis=1)
+    return spectrum.real**2 + spectrum.imag**2
+
+def DensityScale(power: np.ndarray, fs: float, window: np.ndarray, nperseg: int) -> np.ndarray:
+
+    """
+    One-sided power spectral density from averaged |FFT|^2.
+    """
+
+    psd = power/(fs*(window**2).sum())
+    if nperseg % 2: psd[...,1:] *= 2
+    else: psd[...,1:-1] *= 2
+    return psd
+
+class WelchAccumulator:
+
+    def __init__(self, nperseg: int, noverlap: int|None = None):
+
+        """
+        Incremental Welch estimate. Samples are fed with Update() in
+        blocks of any size; only the last nperseg samples are kept
+        between calls.
+        """
+
+        self.nperseg = nperseg
+        self.step = nperseg - (nperseg//2 if noverlap == None else noverlap)
+        self.window = Window(nperseg)
+        self.tail = np.zeros(0)
+        self.power = np.zeros(nperseg//2+1)
+        self.count = 0
+
+    def Update(self, x: np.ndarray) -> int:
+
+        """
+        Returns:
+            (int): Segments added.
+        """
+
+        x = np.concatenate((self.tail, np.asarray(x, dtype=np.float64)))
+        power = SegmentSpectra(x, self.nperseg, self.step, self.window)
+        self.power += power.sum(axis=0)
+        self.count += len(power)
+        consumed = len(power)*self.step # first sample of the next segment
+        self.tail = x[consumed:]
+        return len(power)
+
+    def Result(self, fs: float) -> tuple[np.ndarray, np.ndarray]:
+        freqs = np.fft.rfftfreq(self.nperseg, 1/fs)
+        if self.count == 0:
+            return freqs, np.full(len(freqs), np.nan)
+        return freqs, DensityScale(self.power/self.count, fs, self.window, self.nperseg)
+
+def _WelchJob(path: str, field: str, first: int, last: int, step: int, nperseg: int) -> tuple[np.ndarray,int]:
+    records, _ = Open(path)
+    x = np.asarray(records[field][first*step:(last-1)*step+nperseg], dtype=np.float64)
+    power = SegmentSpectra(x, nperseg, step, Window(nperseg))
+    return power.sum(axis=0), len(power)
+
+def WelchPSD(path: str, fs: float, field = 'torque', nperseg = 4096, noverlap: int|None = None,
+             chunk_size = 1 << 20, processes: int|None = None) -> tuple[np.ndarray, np.ndarray]:
+
+    """
+    Power spectral density of one column of a capture.
+
+    Args:
+        path (str): Capture file.
+        fs (float): Sample rate (Hz).
+        field (str): Column ('torque', 'rpm', ...).
+        nperseg (int): Segment length.
+        noverlap (int, optional): Overlap between segments, nperseg//2 by default.
+        chunk_size (int): Samples read at a time (per worker).
+        processes (int, optional): Worker processes; sequential when None.
+    Returns:
+        (tuple[numpy.ndarray, numpy.ndarray]): Frequencies (Hz) and PSD (unit**2/Hz).
+    """
+
+    if processes == None:
+        welch = WelchAccumulator(nperseg, noverlap)
+        for chunk in Chunks(path, chunk_size):
+            welch.Update(chunk[field])
+        return welch.Result(fs)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    step = nperseg - (nperseg//2 if noverlap == None else noverlap)
+    records, _ = Open(path)
+    segments = (len(records)-nperseg)//step + 1 if len(records) >= nperseg else 0
+    del records
+    per_job = max(chunk_size//step, 1)
+    window = Window(nperseg)
+    power = np.zeros(nperseg//2+1)
+    count = 0
+    with ProcessPoolExecutor(processes) as pool:
+        jobs = [pool.submit(_WelchJob, path, field, first, min(first+per_job, segments), step, nperseg)
+                for first in range(0, segments, per_job)]
+        for job in jobs:
+            job_power, job_count = job.result()
+            power += job_power
+            count += job_count
+    freqs = np.fft.rfftfreq(nperseg, 1/fs)
+    if count == 0:
+        return freqs, np.full(len(freqs), np.nan)
+    return freqs, DensityScale(power/count, fs, window, nperseg)
+
+def Spectrogram(path: str, fs: float, field = 'torque', nperseg = 1024, noverlap: int|None = None,
+                chunk_size = 1 << 20):
+
+    """
+    Short-time PSD of a capture, computed chunk by chunk.
+
+    Yields:
+        (tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]): Segment center
+        times (s from the first sample), frequencies (Hz) and PSD block of
+        shape (frequencies, segments).
+    """
+
+    step = nperseg - (nperseg//2 if noverlap == None else noverlap)
+    window = Window(nperseg)
+    freqs = np.fft.rfftfreq(nperseg, 1/fs)
+    tail = np.zeros(0)
+    first_sample = 0 # index of tail[0] in the capture
+    for chunk in Chunks(path, chunk_size):
+        x = np.concatenate((tail, np.asarray(chunk[field], dtype=np.float64)))
+        power = SegmentSpectra(x, nperseg, step, window)
+        if len(power):
+            psd = DensityScale(power, fs, window, nperseg).T
+            times = (first_sample + np.arange(len(power))*step + nperseg/2)/fs
+            yield times, freqs, psd
+        consumed = len(power)*step
+        tail = x[consumed:]
+        first_sample += consumed
+
+def OrderSpectrum(path: str, field = 'torque', samples_per_rev = 64, revolutions = 16,
+                  chunk_size = 1 << 20) -> tuple[np.ndarray, np.ndarray]:
+
+    """
+    RPM-synchronous (order) spectrum. The column is resampled at
+    constant shaft angle, using the shaft angle integrated from the
+    rpm and time columns, and a Welch estimate is computed in the
+    angle domain.
+
+    Args:
+        path (str): Capture file.
+        field (str): Column to analyse.
+        samples_per_rev (int): Angular resolution, sets the max order (samples_per_rev/2).
+        revolutions (int): Revolutions per segment, sets the order resolution (1/revolutions).
+        chunk_size (int): Samples read at a time.
+    Returns:
+        (tuple[numpy.ndarray, numpy.ndarray]): Orders (events per revolution)
+        and power spectral density (unit**2 per order).
+    """
+
+    welch = WelchAccumulator(samples_per_rev*revolutions)
+    angle_step = 1/samples_per_rev # revolutions
+    last = None # (time, angle, value) of the previous chunk's last sample
+    next_angle = 0.0
+    for chunk in Chunks(path, chunk_size):
+        t = np.asarray(chunk['time'], dtype=np.float64)
+        rev_per_s = np.abs(np.asarray(chunk['rpm'], dtype=np.float64))/60
+        value = np.asarray(chunk[field], dtype=np.float64)
+        if last != None:
+            t = np.concatenate(([last[0]], t))
+            rev_per_s = np.concatenate(([last[1]], rev_per_s))
+            value = np.concatenate(([last[2]], value))
+            start_angle = last[3]
+        else:
+            start_angle = 0.0
+        # trapezoidal integration of the shaft speed
+        angle = np.empty(len(t))
+        angle[0] = start_angle
+        np.cumsum((rev_per_s[1:]+rev_per_s[:-1])/2*np.diff(t), out=angle[1:])
+        angle[1:] += start_angle
+        stop = angle[-1]
+        if stop >= next_angle:
+            grid = np.arange(next_angle, stop, angle_step)
+            if len(grid):
+                # angle is non decreasing; repeated angles (shaft stopped) keep the first value
+                keep = np.concatenate(([True], np.diff(angle) > 0))
+                welch.Update(np.interp(grid, angle[keep], value[keep]))
+                next_angle = grid[-1] + angle_step
+        last = (t[-1], rev_per_s[-1], value[-1], angle[-1])
+    return welch.Result(samples_per_rev)
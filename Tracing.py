@@ -0,0 +1,112 @@
+"""
+=======================================
+Stage-level tracing for Torquimeter transactions (:mod:`Tracing`)
+=======================================
+
+Records spans (stage name, start, end) with monotonic nanosecond
+timestamps into a fixed size ring buffer and dumps them as
+Chrome/Perfetto trace JSON (open in chrome://tracing or ui.perfetto.dev).
+
+Tracing is opt-in: a Torquimeter only records spans when its
+`tracer` attribute is set, otherwise each stage costs a single
+`None` comparison.
+
+    from LCTSfunctions import Torquimeter
+    from Tracing import Tracer
+
+    sensor = Torquimeter(Port='COM3')
+    sensor.tracer = Tracer()
+    for i in range(1000): sensor.ReadRaw()
+    sensor.tracer.Dump('readraw.trace.json')
+
+Traced stages:
+---------------
+    ♦ ReadRaw / Transaction (whole request)
+    ♦ SendTelegram
+    ♦ ReadFrom
+    ♦ Unstuff
+    ♦ Checksums
+    ♦ GetRaw
+    ♦ TransformData
+"""
+
+import json
+import os
+import threading
+from array import array
+from time import perf_counter_ns
+
+class Tracer:
+
+    def __init__(self, capacity = 65536):
+
+        """
+        Args:
+            capacity (int): Number of spans kept. Older spans are
+                            overwritten when the buffer is full.
+        """
+
+        self.capacity = capacity
+        self.names = [] # stage names, indexed by id
+        self.name_ids = {}
+        self.buffer = array('q', bytes(8*4*capacity)) # (name id, thread, start, end) per span
+        self.count = 0 # total of spans recorded since the last Clear
+
+    def Now(self) -> int:
+        return perf_counter_ns()
+
+    def Record(self, name: str, start: int, end: int) -> None:
+
+        """
+        Stores a span. start and end come from Tracer.Now().
+        """
+
+        name_id = self.name_ids.get(name)
+        if name_id == None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        i = (self.count % self.capacity)*4
+        buffer = self.buffer
+        buffer[i]   = name_id
+        buffer[i+1] = threading.get_ident() & 0x7fffffffffffffff
+        buffer[i+2] = start
+        buffer[i+3] = end
+        self.count += 1
+
+    def Clear(self) -> None:
+        self.count = 0
+
+    def Spans(self) -> list[tuple[str,int,int,int]]:
+
+        """
+        Returns:
+            (list[tuple]): (name, thread, start_ns, end_ns) of the
+                           kept spans, oldest first.
+        """
+
+        n = min(self.count, self.capacity)
+        first = self.count - n
+        spans = []
+        for k in range(first, first+n):
+            i = (k % self.capacity)*4
+            name_id, thread, start, end = self.buffer[i:i+4]
+            spans.append((self.names[name_id], thread, start, end))
+        return spans
+
+    def ToChrome(self) -> dict:
+
+        """
+        Converts the kept spans to the Chrome trace event format
+        (complete events, timestamps in microseconds).
+        """
+
+        pid = os.getpid()
+        events = [{"name": name, "cat": "LCTS", "ph": "X",
+                   "ts": start/1000, "dur": (end-start)/1000,
+                   "pid": pid, "tid": thread}
+                  for name, thread, start, end in self.Spans()]
+        return {"traceEvents": events, "displayTimeUnit": "ns"}
+
+    def Dump(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.ToChrome(), file)
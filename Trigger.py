@@ -0,0 +1,316 @@
+"""
+=======================================
+Triggered event capture (:mod:`Trigger`)
+=======================================
+
+Watches the ReadRaw stream and, when a condition fires, saves a window
+of pre- and post-trigger samples as a separate capture (see :mod:`Capture`).
+Only the pre-trigger ring buffer is kept in memory between events, and
+the captures are written by a background thread, so acquisition does
+not stall right after a transient.
+
+Conditions:
+---------------
+    ♦ Threshold(field, level, direction): field crosses level
+    ♦ Slope(field, rate): |d field/dt| >= rate (units per second)
+    ♦ Flag(field): field goes from 0 to 1 (e.g. 'overload' from TransformData)
+    ♦ Change(field): field changes value (e.g. 'fullstroke')
+
+    from Trigger import TriggerEngine, Threshold, Flag, Change
+
+    engine = TriggerEngine([Threshold('torque', 80), Flag('overload'), Change('fullstroke')],
+                           pre=2000, post=5000, directory='events')
+    engine.Attach(sensor)
+    while running: sensor.ReadRaw()
+    engine.Close() # saves a pending event and waits for the writer
+    engine.events # saved captures
+
+Existing captures in `directory` are never overwritten: numbering
+continues after the highest <prefix>_<n>.lcts already there.
+
+Conditions are also checked while the post-trigger window is being
+filled; those triggers do not start a new event but are listed in the
+sidecar of the current one ("retriggers").
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+
+from Capture import RECORD, CaptureWriter, Chunks, SensorMetadata, SensorRow
+
+FIELDS = {name: i for i, name in enumerate(RECORD.names)} # column of each field in a row
+
+class Threshold:
+
+    def __init__(self, field: str, level: float, direction = 'rising'):
+
+        """
+        Args:
+            field (str): RECORD field ('torque', 'rpm', ...).
+            level (float): Threshold in the field units.
+            direction (str): 'rising', 'falling' or 'either'.
+        """
+
+        if direction not in ('rising', 'falling', 'either'):
+            raise ValueError("direction must be 'rising', 'falling' or 'either'")
+        self.index = FIELDS[field]
+        self.level = level
+        self.direction = direction
+        self.name = "%s %s %g" % (field, direction, level)
+
+    def Check(self, previous: tuple, row: tuple) -> bool:
+        before = previous[self.index]
+        after = row[self.index]
+        level = self.level
+        if self.direction != 'falling' and before < level <= after: return True
+        if self.direction != 'rising' and before > level >= after: return True
+        return False
+
+class Slope:
+
+    def __init__(self, field: str, rate: float):
+
+        """
+        Args:
+            field (str): RECORD field.
+            rate (float): Minimum absolute slope, field units per second.
+        """
+
+        self.index = FIELDS[field]
+        self.time = FIELDS['time']
+        self.rate = abs(rate)
+        self.name = "%s slope %g/s" % (field, rate)
+
+    def Check(self, previous: tuple, row: tuple) -> bool:
+        dt = row[self.time] - previous[self.time]
+        if dt <= 0: return False
+        return abs(row[self.index] - previous[self.index]) >= self.rate*dt
+
+class Flag:
+
+    def __init__(self, field = 'overload'):
+        self.index = FIELDS[field]
+        self.name = "%s set" % field
+
+    def Check(self, previous: tuple, row: tuple) -> bool:
+        return bool(row[self.index]) and not previous[self.index]
+
+class Change:
+
+    def __init__(self, field = 'fullstroke'):
+        self.index = FIELDS[field]
+        self.name = "%s change" % field
+
+    def Check(self, previous: tuple, row: tuple) -> bool:
+        return row[self.index] != previous[self.index]
+
+class TriggerEngine:
+
+    def __init__(self, conditions: list, pre = 1000, post = 1000, directory = '.',
+                 prefix = 'event', metadata: dict|None = None):
+
+        """
+        Args:
+            conditions (list): Threshold, Slope, Flag, Change or any object
+                               with Check(previous, row) and name.
+            pre (int): Samples saved before the trigger.
+            post (int): Samples saved after the trigger (trigger sample included).
+            directory (str): Where the event captures are written.
+            prefix (str): File name prefix, files are <prefix>_<n>.lcts, n after the existing ones.
+            metadata (dict, optional): Stored in every event sidecar.
+        """
+
+        self.conditions = list(conditions)
+        self.pre = pre
+        self.post = post
+        self.directory = directory
+        self.prefix = prefix
+        self.metadata = dict(metadata) if metadata != None else {}
+        self.buffer = deque(maxlen=pre)
+        self.previous = None
+        self.event = None # rows of the event being captured
+        self.remaining = 0
+        self.trigger = None # (condition name, trigger time, index of the trigger row)
+        self.retriggers = [] # (condition name, time, row index) fired inside the current event
+        self.events = [] # (path, condition name, trigger time) of the saved events
+        self.sensors = [] # attached sensors, detached by Close
+        os.makedirs(directory, exist_ok=True)
+        self.index = 0 # number of the next event file
+        for name in os.listdir(directory):
+            stem, extension = os.path.splitext(name)
+            number = stem[len(prefix)+1:]
+            if extension == '.lcts' and stem.startswith(prefix + '_') and number.isdigit():
+                self.index = max(self.index, int(number)+1)
+        self.error = None # exception raised by the writer thread
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.Run, name="TriggerWriter", daemon=True)
+        self.thread.start()
+
+    def Attach(self, sensor: object) -> None:
+
+        """
+        Feeds every new ReadRaw sample of the sensor to the engine.
+        """
+
+        self.metadata.update(SensorMetadata(sensor))
+        sensor.listeners.append(self.Update)
+        self.sensors.append(sensor)
+
+    def Detach(self, sensor: object) -> None:
+        if self.Update in sensor.listeners:
+            sensor.listeners.remove(self.Update)
+        if sensor in self.sensors:
+            self.sensors.remove(sensor)
+
+    def Update(self, sensor: object) -> None:
+        self.Feed(SensorRow(sensor))
+
+    def Feed(self, row: tuple) -> str|None:
+
+        """
+        Processes one RECORD row.
+
+        Returns:
+            (str): Path of the event capture completed by this row, else None.
+        """
+
+        saved = None
+        if self.event != None:
+            self.event.append(row)
+            for condition in self.conditions:
+                if condition.Check(self.previous, row):
+                    self.retriggers.append((condition.name, row[0], len(self.event)-1))
+            self.remaining -= 1
+            if self.remaining <= 0:
+                saved = self.Save()
+        elif self.previous != None:
+            for condition in self.conditions:
+                if condition.Check(self.previous, row):
+                    self.event = list(self.buffer)
+                    self.event.append(row)
+                    self.trigger = (condition.name, row[0], len(self.event)-1)
+                    self.remaining = self.post - 1
+                    if self.remaining <= 0:
+                        saved = self.Save()
+                    break
+        self.buffer.append(row)
+        self.previous = row
+        return saved
+
+    def FeedRecords(self, records, chunk_size = 65536) -> list[str]:
+
+        """
+        Runs the conditions over recorded RECORD rows, chunk by chunk, so
+        memory does not grow with the length of the recording.
+
+        Args:
+            records (str | numpy.ndarray): Capture path or RECORD rows (e.g. Capture.Open).
+            chunk_size (int): Rows converted at a time.
+        Returns:
+            (list[str]): Paths of the events saved (written when this returns).
+        """
+
+        if isinstance(records, str):
+            chunks = Chunks(records, chunk_size)
+        else:
+            chunks = (records[start:start+chunk_size] for start in range(0, len(records), chunk_size))
+        saved = []
+        for chunk in chunks:
+            for row in chunk.tolist():
+                path = self.Feed(row)
+                if path != None: saved.append(path)
+        self.Wait()
+        return saved
+
+    def Save(self) -> str:
+
+        """
+        Hands the current event to the writer thread.
+
+        Returns:
+            (str): Path of the event capture, complete after Wait or Close.
+        """
+
+        self.CheckError()
+        name, trigger_time, trigger_index = self.trigger
+        path = os.path.join(self.directory, "%s_%04d.lcts" % (self.prefix, self.index))
+        while os.path.exists(path) or os.path.exists(path + '.json'):
+            self.index += 1
+            path = os.path.join(self.directory, "%s_%04d.lcts" % (self.prefix, self.index))
+        self.index += 1
+        metadata = dict(self.metadata)
+        metadata.update({"trigger": name, "trigger_time": trigger_time,
+                         "trigger_index": trigger_index,
+                         "retriggers": [list(retrigger) for retrigger in self.retriggers]})
+        self.queue.put((path, self.event, metadata))
+        self.events.append((path, name, trigger_time))
+        self.event = None
+        self.retriggers = []
+        return path
+
+    def Run(self) -> None:
+
+        """
+        Writer thread: writes the queued events.
+        """
+
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None: break
+                if self.error != None: continue # the error is raised by the producer
+                path, rows, metadata = item
+                # short conversions, the acquisition thread gets the GIL back sooner
+                with CaptureWriter(path, metadata=metadata, flush_every=1024) as capture:
+                    for row in rows:
+                        capture.AppendRow(row)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def CheckError(self) -> None:
+        if self.error != None:
+            raise RuntimeError("trigger writer failed: %s" % self.error) from self.error
+
+    def Wait(self) -> None:
+
+        """
+        Waits until the events saved so far are written.
+        """
+
+        self.queue.join()
+        self.CheckError()
+
+    def Flush(self) -> str|None:
+
+        """
+        Saves an event still waiting for post-trigger samples.
+        """
+
+        if self.event == None: return None
+        return self.Save()
+
+    def Close(self) -> None:
+
+        """
+        Detaches the sensors, saves an event still waiting for post-trigger
+        samples and waits for the writer thread.
+        """
+
+        for sensor in list(self.sensors): self.Detach(sensor)
+        if not self.thread.is_alive(): return
+        try:
+            self.Flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+        self.CheckError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
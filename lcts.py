@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+=======================================
+Command-line interface (:mod:`lcts`)
+=======================================
+
+    python lcts.py status                     # Hello + ReadStatusShort, exit code 0 if ERROR_OK
+    python lcts.py read -n 5                  # ReadRaw samples, exit code 1 if any is missing
+    python lcts.py stream --interval 0.01     # CSV samples until Ctrl+C
+    python lcts.py record run01.lcts -n 100000
+    python lcts.py export run01.parquet --rotate-s 600 --config-blocks 0 1
+    python lcts.py plot run01.lcts            # or: plot --live
+    python lcts.py bench -n 5000 --trace bench.trace.json
+    python lcts.py tune --save                # sweep link settings, save port profile
+    python lcts.py --profile read             # use the saved profile of the port
+
+Heavy modules (NumPy, matplotlib, pyarrow, h5py) are imported only by the subcommands
+that use them, and the serial port is opened without waiting, so short
+health checks start quickly.
+"""
+
+import argparse
+import sys
+
+def FindPort() -> str:
+
+    """
+    First serial port listed by the system.
+    """
+
+    import serial.tools.list_ports
+    ports = list(serial.tools.list_ports.comports())
+    if not ports:
+        raise SystemExit("no serial port found, use --port")
+    return ports[0][0]
+
+def Connect(args) -> object:
+    from LCTSfunctions import Torquimeter
+    sensor = Torquimeter(Port=args.port or FindPort(), Tm_max=args.tm_max, Rpm_max=args.rpm_max,
+                         Baudrate=args.baudrate, Timeout=args.timeout)
+    if args.profile:
+        from AutoTune import Apply, LoadProfile
+        profile = LoadProfile(sensor.serialport.port)
+        if profile == None:
+            print("no profile saved for %s, using defaults" % sensor.serialport.port, file=sys.stderr)
+        else:
+            Apply(sensor, profile)
+    return sensor
+
+def FormatSample(sample: tuple) -> str:
+    return "%d,%d,%.4f,%.2f,%d,%d" % (sample[0], sample[1], sample[2], sample[3],
+                                      sample[4], sample[5])
+
+def Read(args) -> int:
+    from LCTSfunctions import SampleStatus
+    sensor = Connect(args)
+    missing = 0
+    for i in range(args.count):
+        sample = sensor.ReadRaw(tries=args.tries)
+        if sample[6] == SampleStatus.MISSING: missing += 1
+        print("torque=%.4f rpm=%.2f channel_0=%d channel_1=%d fullstroke=%d overload=%d status=%s"
+              % (sample[2], sample[3], sample[0], sample[1], sample[4], sample[5], sample[6].name))
+    return 1 if missing else 0
+
+def Stream(args) -> int:
+    import time
+    sensor = Connect(args)
+    write = sys.stdout.write
+    write("time,channel_0,channel_1,torque,rpm,fullstroke,overload,status\n")
+    n = 0
+    try:
+        while args.count == 0 or n < args.count:
+            sample = sensor.ReadRaw(tries=args.tries)
+            write("%.6f,%s,%s\n" % (sample[7], FormatSample(sample), sample[6].name))
+            n += 1
+            if args.interval: time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    sys.stdout.flush()
+    return 0
+
+def Record(args) -> int:
+    import time
+    from Capture import CaptureWriter
+    sensor = Connect(args)
+    end = time.monotonic() + args.duration if args.duration else None
+    n = 0
+    with CaptureWriter(args.output, sensor) as capture:
+        try:
+            while (args.count == 0 or n < args.count) and (end == None or time.monotonic() < end):
+                sensor.ReadRaw(tries=args.tries)
+                capture.Append(sensor)
+                n += 1
+        except KeyboardInterrupt:
+            pass
+    print("%d samples written to %s" % (n, args.output), file=sys.stderr)
+    return 0
+
+def Export(args) -> int:
+    import time
+    from Export import ExportWriter
+    sensor = Connect(args)
+    end = time.monotonic() + args.duration if args.duration else None
+    n = 0
+    with ExportWriter(args.output, sensor, compression=args.compression, row_group=args.row_group,
+                      max_bytes=int(args.rotate_mb*1e6) if args.rotate_mb else None,
+                      max_seconds=args.rotate_s or None, config_blocks=args.config_blocks) as export:
+        try:
+            while (args.count == 0 or n < args.count) and (end == None or time.monotonic() < end):
+                sensor.ReadRaw(tries=args.tries)
+                export.Append(sensor)
+                n += 1
+        except KeyboardInterrupt:
+            pass
+    print("%d samples written to %s" % (n, ", ".join(export.files)), file=sys.stderr)
+    return 0
+
+def Plot(args) -> int:
+    import matplotlib.pyplot as plt
+    if args.live:
+        from collections import deque
+        import matplotlib.animation as animation
+        sensor = Connect(args)
+        y_data = deque([0.0]*args.window, maxlen=args.window)
+        fig, ax = plt.subplots()
+        line, = ax.plot(range(args.window), y_data)
+        ax.set_ylim(-sensor.Tm_max, sensor.Tm_max)
+        ax.set_xlabel("Sample")
+        ax.set_ylabel("Torque (N.m)")
+        def Animate(i):
+            y_data.append(sensor.ReadRaw(tries=args.tries)[2])
+            line.set_ydata(y_data)
+            return line,
+        ani = animation.FuncAnimation(fig, Animate, interval=1, blit=True, cache_frame_data=False)
+        plt.show()
+        return 0
+    if not args.capture:
+        raise SystemExit("plot needs a capture file or --live")
+    from Capture import Open
+    records, metadata = Open(args.capture)
+    t = records['time'] - records['time'][0] if len(records) else records['time']
+    fig, (ax_torque, ax_rpm) = plt.subplots(2, 1, sharex=True)
+    ax_torque.plot(t, records['torque'])
+    ax_torque.set_ylabel("Torque (N.m)")
+    ax_rpm.plot(t, records['rpm'])
+    ax_rpm.set_ylabel("RPM")
+    ax_rpm.set_xlabel("Time (s)")
+    fig.suptitle(args.capture)
+    plt.show()
+    return 0
+
+def Bench(args) -> int:
+    from time import perf_counter_ns
+    if args.count < 1:
+        raise SystemExit("bench needs -n/--count of at least 1")
+    sensor = Connect(args)
+    if args.trace:
+        from Tracing import Tracer
+        sensor.tracer = Tracer(capacity=max(args.count*8, 1024))
+    latencies = []
+    start = perf_counter_ns()
+    for i in range(args.count):
+        t0 = perf_counter_ns()
+        sensor.ReadRaw(tries=args.tries)
+        latencies.append(perf_counter_ns()-t0)
+    elapsed = (perf_counter_ns()-start)/1e9
+    latencies.sort()
+    def Percentile(p): return latencies[min(int(p*len(latencies)), len(latencies)-1)]/1e3
+    print("samples: %d  rate: %.1f samples/s  missing: %d  retries: %d"
+          % (args.count, args.count/elapsed, sensor.missing, sensor.retries))
+    print("latency (us): p50 %.1f  p95 %.1f  p99 %.1f  max %.1f"
+          % (Percentile(0.50), Percentile(0.95), Percentile(0.99), latencies[-1]/1e3))
+    if args.trace:
+        sensor.tracer.Dump(args.trace)
+        print("trace written to %s" % args.trace)
+    return 0
+
+def Tune(args) -> int:
+    from AutoTune import Tune as TuneLink, SaveProfile
+    if args.count < 1:
+        raise SystemExit("tune needs -n/--count of at least 1")
+    sensor = Connect(args)
+    best, results = TuneLink(sensor, baudrates=args.baudrates, samples=args.count,
+                             max_error_rate=args.max_error_rate)
+    print("baudrate timeout chunk   gap      samples/s  p50(us)  p99(us)  errors")
+    for r in results:
+        print("%8d %7.4f %5s %8.6f %10.1f %8.1f %8.1f %7.4f"
+              % (r["baudrate"], r["timeout"], r["chunk_size"], r["gap"], r["samples_per_s"],
+                 r["latency_p50"]*1e6, r["latency_p99"]*1e6, r["error_rate"]))
+    if best == None:
+        print("no stable setting found")
+        return 1
+    print("best: baudrate=%d timeout=%g chunk_size=%s gap=%g (%.1f samples/s)"
+          % (best["baudrate"], best["timeout"], best["chunk_size"], best["gap"], best["samples_per_s"]))
+    if args.save:
+        print("profile saved to %s" % SaveProfile(sensor.serialport.port, best))
+    return 0
+
+def Status(args) -> int:
+    from LCTSfunctions import ErrorCode
+    sensor = Connect(args)
+    hello = sensor.Hello(tries=args.tries)
+    status = sensor.ReadStatusShort(tries=args.tries)
+    print("hello: %s" % (hello,))
+    print("status: %s" % (status,))
+    error = getattr(status, "error", None)
+    return 0 if error == ErrorCode.ERROR_OK else 1
+
+def Parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="lcts", description="Rotary torque transducer tools")
+    parser.add_argument("--port", help="serial port (default: first port found)")
+    parser.add_argument("--baudrate", type=int, default=230400)
+    parser.add_argument("--timeout", type=float, default=0.003, help="read timeout (s)")
+    parser.add_argument("--tm-max", type=float, default=100, help="device max torque")
+    parser.add_argument("--rpm-max", type=float, default=30000, help="device max rpm")
+    parser.add_argument("--tries", type=int, default=1)
+    parser.add_argument("--profile", action="store_true", help="apply the saved link profile of the port")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    read = commands.add_parser("read", help="read samples, exit code 1 if any is missing")
+    read.add_argument("-n", "--count", type=int, default=1)
+    read.set_defaults(run=Read)
+
+    stream = commands.add_parser("stream", help="print samples as CSV")
+    stream.add_argument("-n", "--count", type=int, default=0, help="0 = until Ctrl+C")
+    stream.add_argument("--interval", type=float, default=0.0, help="pause between samples (s)")
+    stream.set_defaults(run=Stream)
+
+    record = commands.add_parser("record", help="record samples to a capture file")
+    record.add_argument("output")
+    record.add_argument("-n", "--count", type=int, default=0, help="0 = until Ctrl+C/--duration")
+    record.add_argument("--duration", type=float, default=0.0, help="seconds")
+    record.set_defaults(run=Record)
+
+    export = commands.add_parser("export", help="write samples to Parquet (.parquet) or HDF5 (.h5) files")
+    export.add_argument("output")
+    export.add_argument("-n", "--count", type=int, default=0, help="0 = until Ctrl+C/--duration")
+    export.add_argument("--duration", type=float, default=0.0, help="seconds")
+    export.add_argument("--compression", help="codec (default: zstd for Parquet, gzip for HDF5)")
+    export.add_argument("--row-group", type=int, default=65536, help="samples per row group")
+    export.add_argument("--rotate-mb", type=float, default=0.0, help="start a new file after this size")
+    export.add_argument("--rotate-s", type=float, default=0.0, help="start a new file after this time")
+    export.add_argument("--config-blocks", type=int, nargs="+", default=(), help="config blocks stored as metadata")
+    export.set_defaults(run=Export)
+
+    plot = commands.add_parser("plot", help="plot a capture file or the live torque")
+    plot.add_argument("capture", nargs="?")
+    plot.add_argument("--live", action="store_true")
+    plot.add_argument("--window", type=int, default=500, help="samples shown in live mode")
+    plot.set_defaults(run=Plot)
+
+    bench = commands.add_parser("bench", help="measure ReadRaw rate and latency")
+    bench.add_argument("-n", "--count", type=int, default=1000)
+    bench.add_argument("--trace", help="write a Chrome trace of the run")
+    bench.set_defaults(run=Bench)
+
+    tune = commands.add_parser("tune", help="find the fastest stable link settings")
+    tune.add_argument("-n", "--count", type=int, default=500, help="samples per setting")
+    tune.add_argument("--baudrates", type=int, nargs="+", help="host baud rates to try (device must match)")
+    tune.add_argument("--max-error-rate", type=float, default=0.001)
+    tune.add_argument("--save", action="store_true", help="save the best setting as the port profile")
+    tune.set_defaults(run=Tune)
+
+    status = commands.add_parser("status", help="Hello and short status, exit code 1 on error")
+    status.set_defaults(run=Status)
+    return parser
+
+def main(argv: list[str]|None = None) -> int:
+    args = Parser().parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+ExportWriter with a fake sensor (needs pyarrow).
+
+    python -m pytest -q test_Export.py
+"""
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from Export import ExportWriter
+
+class FakeSensor:
+
+    """
+    Attributes read by Capture.SensorRow; ReadRaw only runs the listeners.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.data = (11, 21, 40, 1000, 0)
+        self.timestamp = 0.0
+        self.Torque_calibrated = 0.16
+        self.RPM_calibrated = 1200.0
+        self.Overloadflag = 0
+        self.status = 0
+
+    def ReadRaw(self) -> None:
+        self.timestamp += 0.001
+        for listener in self.listeners: listener(self)
+
+def test_close_detaches_the_sensor(tmp_path):
+    sensor = FakeSensor()
+    path = str(tmp_path / "run.parquet")
+    with ExportWriter(path, row_group=10) as export:
+        export.Attach(sensor)
+        for i in range(25): sensor.ReadRaw()
+    assert sensor.listeners == []
+    for i in range(25): sensor.ReadRaw() # used to raise "export writer is closed"
+    assert pq.read_table(path).num_rows == 25
+
+def test_detach_stops_the_export(tmp_path):
+    sensor = FakeSensor()
+    path = str(tmp_path / "run.parquet")
+    with ExportWriter(path, row_group=10) as export:
+        export.Attach(sensor)
+        for i in range(5): sensor.ReadRaw()
+        export.Detach(sensor)
+        for i in range(5): sensor.ReadRaw()
+    assert pq.read_table(path).num_rows == 5
@@ -0,0 +1,126 @@
+"""
+Resynchronization cases of FrameReader, over a fake serial port.
+
+    python -m pytest -q test_FrameReader.py
+"""
+
+from LCTSfunctions import STX, SCMD_ReadRaw, SCMD_Hello, FrameReader, Methods
+
+class FakePort:
+
+    """
+    Serial port whose input arrives in the given chunks, one chunk per
+    read that finds nothing buffered; an empty read is a timeout.
+    """
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = list(chunks)
+        self.available = bytearray()
+
+    def Arrive(self, *chunks: bytes) -> None:
+        self.chunks.extend(chunks)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.available)
+
+    def read(self, size = 1) -> bytes:
+        if not self.available and self.chunks:
+            self.available += self.chunks.pop(0)
+        data = bytes(self.available[:size])
+        del self.available[:size]
+        return data
+
+def Frame(command: int, parameters: list[int], rx = 0xff, tx = 0x01) -> bytes:
+
+    """
+    Telegram as sent on the line, with byte stuffing.
+    """
+
+    body = [command, rx, tx, len(parameters)] + list(parameters)
+    body += Methods.CalcChecksums(body)
+    line = [STX, STX]
+    for byte in body:
+        line.append(byte)
+        if byte == STX: line.append(STX)
+    return bytes(line)
+
+RAW = [0, 11, 0, 21, 1, 40, 3, 232, 0]
+
+def test_clean_frame():
+    reader = FrameReader(FakePort(Frame(SCMD_ReadRaw, RAW)))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.frame_size == len(Frame(SCMD_ReadRaw, RAW))
+
+def test_back_to_back_frames_in_one_read():
+    reader = FrameReader(FakePort(Frame(SCMD_ReadRaw, RAW) + Frame(SCMD_Hello, [0, 1])))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.Next() == [SCMD_Hello, [0, 1]]
+    assert reader.Next() == None
+    assert reader.timeouts == 1
+
+def test_frame_split_across_reads():
+    frame = Frame(SCMD_ReadRaw, RAW)
+    reader = FrameReader(FakePort(frame[:1], frame[1:4], frame[4:9], frame[9:]))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+
+def test_garbage_before_header_is_dropped():
+    reader = FrameReader(FakePort(b'\x00\x13\x02\x7f' + Frame(SCMD_ReadRaw, RAW)))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.garbage_bytes == 4
+
+def test_stuffed_parameters():
+    parameters = [STX, 11, STX, STX, 1, 40, 3, 232, STX]
+    frame = Frame(SCMD_ReadRaw, parameters)
+    reader = FrameReader(FakePort(frame[:7], frame[7:]))
+    assert reader.Next() == [SCMD_ReadRaw, parameters]
+    assert reader.frame_size == len(frame)
+
+def test_stuffed_header():
+    frame = Frame(SCMD_Hello, [STX, STX], rx=STX, tx=STX) # rx, tx and n are 0x02
+    reader = FrameReader(FakePort(frame))
+    assert reader.Next() == [SCMD_Hello, [STX, STX]]
+
+def test_truncated_frame_followed_by_a_new_one():
+    truncated = Frame(SCMD_ReadRaw, RAW)[:9] # the rest of this frame was lost
+    reader = FrameReader(FakePort(truncated + Frame(SCMD_ReadRaw, RAW)))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.Next() == None
+
+def test_lone_stx_breaks_the_frame():
+    truncated = Frame(SCMD_ReadRaw, RAW)[:9]
+    reader = FrameReader(FakePort(truncated + bytes([STX, 0x33]) + Frame(SCMD_ReadRaw, RAW)))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.checksum_errors == 0 # cut at the lone STX, not rejected by the checksum
+    assert reader.garbage_bytes == 11
+
+def test_corrupted_frame_is_skipped():
+    corrupted = bytearray(Frame(SCMD_ReadRaw, RAW))
+    corrupted[8] ^= 0x10
+    reader = FrameReader(FakePort(bytes(corrupted) + Frame(SCMD_Hello, [0, 1])))
+    assert reader.Next() == [SCMD_Hello, [0, 1]]
+    assert reader.checksum_errors >= 1
+
+def test_stale_frames_are_discarded():
+    port = FakePort()
+    port.available += Frame(SCMD_ReadRaw, [0]*9) # late reply already waiting
+    reader = FrameReader(port)
+    reader.MarkStale()
+    port.Arrive(Frame(SCMD_ReadRaw, RAW))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.stale_frames == 1
+
+def test_partial_stale_frame_does_not_hide_the_reply():
+    late = Frame(SCMD_ReadRaw, [0]*9)
+    port = FakePort(late[:6])
+    reader = FrameReader(port)
+    assert reader.Next() == None # timeout, the partial frame stays buffered
+    reader.MarkStale()
+    port.Arrive(late[6:] + Frame(SCMD_ReadRaw, RAW))
+    assert reader.Next() == [SCMD_ReadRaw, RAW]
+    assert reader.stale_frames == 1
+
+def test_timeout_on_silence():
+    reader = FrameReader(FakePort())
+    assert reader.Next() == None
+    assert reader.timeouts == 1
@@ -0,0 +1,36 @@
+"""
+TriggerEngine event files (needs numpy).
+
+    python -m pytest -q test_Trigger.py
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from Capture import RECORD, Open, ReadMetadata
+from Trigger import TriggerEngine, Flag
+
+def Overloads(*indices: int, n = 1000) -> np.ndarray:
+    records = np.zeros(n, dtype=RECORD)
+    records['time'] = np.arange(n)*1e-3
+    records['overload'][list(indices)] = 1
+    return records
+
+def test_events_are_written(tmp_path):
+    with TriggerEngine([Flag()], pre=10, post=20, directory=str(tmp_path)) as engine:
+        saved = engine.FeedRecords(Overloads(100, 105, 500))
+    assert len(saved) == 2
+    records, metadata = Open(saved[0])
+    assert len(records) == 30
+    assert metadata["trigger_index"] == 10
+    assert [retrigger[2] for retrigger in metadata["retriggers"]] == [15]
+
+def test_a_second_run_does_not_overwrite(tmp_path):
+    with TriggerEngine([Flag()], pre=10, post=20, directory=str(tmp_path)) as engine:
+        first = engine.FeedRecords(Overloads(100))
+    with TriggerEngine([Flag()], pre=10, post=20, directory=str(tmp_path)) as engine:
+        second = engine.FeedRecords(Overloads(200))
+    assert first[0] != second[0]
+    assert ReadMetadata(first[0])["trigger_time"] == pytest.approx(0.1)
+    assert ReadMetadata(second[0])["trigger_time"] == pytest.approx(0.2)